@@ -0,0 +1,308 @@
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterable
+
+import requests
+
+from mems import cache, history, net, snapshot, suppliers, utils
+from mems.cache import CacheEntry
+from mems.suppliers import Part
+
+logger = logging.getLogger(__name__)
+
+# Keys starting with this prefix are looked up by manufacturer part number instead of supplier SKU
+MPN_PREFIX = "mpn:"
+
+BACKENDS: dict[str, type["Backend"]] = {}
+_backends: dict[str, "Backend"] = {}
+_backends_lock = threading.Lock()
+_serving = False
+
+
+def mpn_key(mpn: str) -> str:
+    return MPN_PREFIX + mpn.strip()
+
+
+class Backend(ABC):
+    """Supplier lookup backend. Every key is fetched once while its result is fresh, even if requested concurrently."""
+
+    # Maximum number of keys passed to single `fetch_many` call
+    batch_size = 1
+
+    def __init_subclass__(cls, /, name, **kwargs):
+        super().__init_subclass__(**kwargs)
+        BACKENDS[name] = cls
+        cls.name = name
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Results of finished and in-flight lookups with time they were started, keyed by (key, volatile)
+        self.futures: dict[tuple[str, bool], tuple[Future[Part | None], float]] = {}
+        # (static_time, volatile_time) of entries that found parts were served from, keyed like `futures`
+        self.times: dict[tuple[str, bool], tuple[float, float]] = {}
+        # Keys whose last lookup left them unpriced without searching supplier, see `skip`
+        self.skipped: set[str] = set()
+        self.breaker = net.CircuitBreaker(self.name)
+
+    @abstractmethod
+    def fetch_many(self, keys: list[str]) -> dict[str, Part | None]:
+        """Fetches parts from supplier, bypassing cache. Returned dict must contain all of `keys`."""
+
+    def lookup(self, keys: Iterable[str], volatile: bool = True) -> dict[str, Part | None]:
+        """Looks up parts using in-process results, cache and finally supplier, in concurrent batches.
+
+        Set `volatile` to False if stock and prices aren't needed, so that only static data TTL is checked.
+        """
+        keys = list(keys)
+        normalized = list(dict.fromkeys(key.strip() for key in keys))
+
+        futures: dict[str, Future[Part | None]] = {}
+        owned: list[str] = []
+        with self.lock:
+            for key in normalized:
+                future = self.memo(key, True, volatile)
+                if future is None and not volatile:
+                    future = self.memo(key, False, volatile)
+                if future is None:
+                    future = Future()
+                    self.futures[(key, volatile)] = (future, time.time())
+                    self.skipped.discard(key)
+                    owned.append(key)
+                futures[key] = future
+
+        try:
+            self.resolve(owned, futures, volatile)
+        except BaseException as e:
+            self.fail([key for key in owned if not futures[key].done()], futures, volatile, e)
+            raise
+
+        return {key: futures[key.strip()].result() for key in keys}
+
+    def memo(self, key: str, memo_volatile: bool, volatile: bool) -> Future[Part | None] | None:
+        """Returns in-flight lookup of key, or finished one that is still fresh. Must be called with lock held.
+
+        Finished results expire like cache entries, so long running processes (cache server) look parts up again.
+        """
+        memo = self.futures.get((key, memo_volatile))
+        if memo is None:
+            return None
+        future, started = memo
+        store = cache.get_cache()
+        if future.done() and not store.is_fresh(started, store.volatile_ttl if volatile else store.static_ttl):
+            del self.futures[(key, memo_volatile)]
+            self.times.pop((key, memo_volatile), None)
+            return None
+        return future
+
+    def resolve(self, owned: list[str], futures: dict[str, Future[Part | None]], volatile: bool):
+        """Sets results of lookups owned by this call, from cache or from supplier."""
+        snapshot_path = cache.get_offline_snapshot()
+        if snapshot_path is not None:
+            self.resolve_offline(owned, futures, volatile, snapshot.open_snapshot(snapshot_path))
+            return
+
+        missing = []
+        store = cache.get_cache()
+        for key in owned:
+            entry = store.get(self.name, key, volatile=volatile)
+            if entry is not None:
+                logger.debug(f"Cache hit for {self.name} {key}")
+                self.serve(key, futures, volatile, cache.part_from_entry(entry), entry)
+            else:
+                missing.append(key)
+
+        server = get_cache_server()
+        if server is not None and missing:
+            entries = lookup_remote(server, self.name, missing, volatile)
+            if entries is not None:
+                for key in missing:
+                    entry = entries.get(key)
+                    if entry is not None:
+                        store.put_entry(self.name, key, entry)
+                        self.serve(key, futures, volatile, cache.part_from_entry(entry), entry)
+                    else:
+                        futures[key].set_result(None)
+                return
+
+        batches = [missing[start : start + self.batch_size] for start in range(0, len(missing), self.batch_size)]
+        if batches:
+            with ThreadPoolExecutor(max_workers=net.get_concurrency(self.name)) as executor:
+                for future in [executor.submit(self.resolve_batch, batch, futures, volatile) for batch in batches]:
+                    future.result()
+
+    def resolve_offline(
+        self, owned: list[str], futures: dict[str, Future[Part | None]], volatile: bool, offline: snapshot.Snapshot
+    ):
+        for key in owned:
+            entry = offline.get(self.name, key)
+            if entry is None:
+                logger.warning(f"{self.name} {key} not found in offline snapshot")
+                futures[key].set_result(None)
+            else:
+                self.serve(key, futures, volatile, cache.part_from_entry(entry), entry)
+
+    def serve(self, key: str, futures: dict[str, Future[Part | None]], volatile: bool, part: Part, entry: CacheEntry):
+        """Sets found part as result of lookup, remembering times of the entry it comes from."""
+        with self.lock:
+            self.times[(key, volatile)] = (entry.static_time, entry.volatile_time)
+        futures[key].set_result(part)
+
+    def fail(self, keys: list[str], futures: dict[str, Future[Part | None]], volatile: bool, e: BaseException):
+        """Propagates error to everyone waiting for `keys` and forgets them, so they can be retried."""
+        with self.lock:
+            for key in keys:
+                self.futures.pop((key, volatile), None)
+                self.times.pop((key, volatile), None)
+        for key in keys:
+            futures[key].set_exception(e)
+
+    def skip(self, keys: list[str], futures: dict[str, Future[Part | None]], volatile: bool, reason: str):
+        """Leaves `keys` unpriced for everyone waiting for them and forgets them, so they can be retried."""
+        logger.error(f"Couldn't search {self.name} for {', '.join(keys)}, leaving them unpriced. {reason}")
+        with self.lock:
+            for key in keys:
+                self.futures.pop((key, volatile), None)
+                self.times.pop((key, volatile), None)
+            self.skipped.update(keys)
+        for key in keys:
+            futures[key].set_result(None)
+
+    def resolve_batch(self, batch: list[str], futures: dict[str, Future[Part | None]], volatile: bool):
+        if not self.breaker.allow():
+            self.skip(batch, futures, volatile, f"{self.name} is unavailable")
+            return
+        logger.info(f"Searching {self.name} for {', '.join(batch)}")
+        try:
+            fetched = self.fetch_many(batch)
+        except (net.NotRecorded, suppliers.MissingCredentials) as e:
+            # Neither says anything about supplier availability, other keys may still be recorded
+            self.skip(batch, futures, volatile, str(e))
+            return
+        except requests.RequestException as e:
+            self.breaker.failed()
+            self.skip(batch, futures, volatile, str(e))
+            return
+        except BaseException as e:
+            self.fail(batch, futures, volatile, e)
+            raise
+        self.breaker.succeeded()
+
+        now = time.time()
+        for key in batch:
+            part = fetched.get(key)
+            if part is not None:
+                entry = CacheEntry(*cache.part_to_entry(part), now, now)
+                cache.get_cache().put_entry(self.name, key, entry)
+                self.serve(key, futures, volatile, part, entry)
+            else:
+                futures[key].set_result(None)
+        history.record(self.name, {key: fetched.get(key) for key in batch})
+
+
+class MouserBackend(Backend, name="Mouser"):
+    batch_size = suppliers.MOUSER_BATCH_SIZE
+
+    def fetch_many(self, keys: list[str]) -> dict[str, Part | None]:
+        results = {}
+        skus = [key for key in keys if not key.startswith(MPN_PREFIX)]
+        mpns = [key.removeprefix(MPN_PREFIX) for key in keys if key.startswith(MPN_PREFIX)]
+        for prefix, field, values in [("", "MouserPartNumber", skus), (MPN_PREFIX, "ManufacturerPartNumber", mpns)]:
+            responses = suppliers.search_mouser_batch(
+                values, lambda response, value: suppliers.find_matching_mouser_part(response, field, value)
+            )
+            for value, data in responses.items():
+                results[prefix + value] = suppliers.part_from_mouser(data) if data is not None else None
+        return results
+
+
+class LCSCBackend(Backend, name="LCSC"):
+    def fetch_many(self, keys: list[str]) -> dict[str, Part | None]:
+        results = {}
+        for key in keys:
+            if key.startswith(MPN_PREFIX):
+                mpn = key.removeprefix(MPN_PREFIX)
+                results[key] = next((part for part in suppliers.search_lcsc(mpn) if part.mpn == mpn), None)
+            else:
+                results[key] = next((part for part in suppliers.search_lcsc(key) if part.sku == key), None)
+        return results
+
+
+class TMEBackend(Backend, name="TME"):
+    batch_size = suppliers.TME_BATCH_SIZE
+
+    def fetch_many(self, keys: list[str]) -> dict[str, Part | None]:
+        results: dict[str, Part | None] = {key: None for key in keys if key.startswith(MPN_PREFIX)}
+        if results:
+            logger.warning(f"TME can be searched only by symbol, skipping {', '.join(results)}")
+        symbols = [key for key in keys if not key.startswith(MPN_PREFIX)]
+        if symbols:
+            results |= suppliers.search_tme(symbols)
+        return results
+
+
+def get_cache_server() -> str | None:
+    """Returns URL of shared cache server from config, or None if lookups should go directly to suppliers."""
+    if _serving:
+        return None
+    return utils.get_config().get("cache_server") or None
+
+
+def serve():
+    """Marks this process as cache server, so that its lookups go directly to suppliers."""
+    global _serving
+    _serving = True
+
+
+def lookup_remote(server: str, supplier: str, keys: list[str], volatile: bool) -> dict[str, CacheEntry | None] | None:
+    """Looks up parts through shared cache server. Returns None if server can't be reached."""
+    logger.info(f"Searching {supplier} through cache server for {', '.join(keys)}")
+    try:
+        r = net.post(
+            server.rstrip("/") + "/lookup", json={"supplier": supplier, "keys": keys, "volatile": volatile}
+        )
+        r.raise_for_status()
+        entries = r.json()["entries"]
+    except (requests.RequestException, ValueError, KeyError) as e:
+        logger.warning(f"Cache server {server} not available, searching {supplier} directly. {e}")
+        return None
+    return {key: CacheEntry(**entry) if entry is not None else None for key, entry in entries.items()}
+
+
+def get_backend(name: str) -> Backend:
+    """Returns process wide backend instance for supplier."""
+    with _backends_lock:
+        if name not in _backends:
+            _backends[name] = BACKENDS[name]()
+        return _backends[name]
+
+
+def lookup(supplier: str, keys: Iterable[str], volatile: bool = True) -> dict[str, Part | None]:
+    """Looks up many parts in supplier. See `Backend.lookup`."""
+    return get_backend(supplier).lookup(keys, volatile=volatile)
+
+
+def served_times(supplier: str, keys: Iterable[str], volatile: bool = True) -> dict[str, tuple[float, float]]:
+    """Returns (static_time, volatile_time) of entries that found parts of `keys` were last looked up from.
+
+    Times come from cache, cache server or offline snapshot entry, or are the time part was fetched from supplier.
+    """
+    backend = get_backend(supplier)
+    times = {}
+    with backend.lock:
+        for key in keys:
+            served = backend.times.get((key.strip(), True))
+            if served is None and not volatile:
+                served = backend.times.get((key.strip(), False))
+            if served is not None:
+                times[key] = served
+    return times
+
+
+def skipped(supplier: str, keys: Iterable[str]) -> set[str]:
+    """Returns those of `keys` that were left unpriced by their last lookup without searching supplier."""
+    backend = get_backend(supplier)
+    with backend.lock:
+        return {key for key in keys if key.strip() in backend.skipped}
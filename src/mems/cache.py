@@ -0,0 +1,243 @@
+import dataclasses
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Iterator
+
+from mems import utils
+from mems.suppliers import Part, PriceBreak
+
+logger = logging.getLogger(__name__)
+
+CACHE_FILENAME = "supplier_cache.sqlite"
+
+# Defaults used when config.json doesn't have a "cache" section
+DEFAULT_STATIC_TTL_DAYS = 30.0
+DEFAULT_VOLATILE_TTL_HOURS = 24.0
+DEFAULT_MAX_ENTRIES = 50000
+
+# Part fields that change often (stock, prices). Everything else is considered static.
+VOLATILE_FIELDS = ("availability", "price_breaks")
+
+
+@dataclasses.dataclass
+class CacheEntry:
+    static: dict
+    volatile: dict
+    static_time: float
+    volatile_time: float
+
+
+class SupplierCache:
+    """SQLite backed cache of supplier lookups keyed by supplier name and SKU/MPN."""
+
+    def __init__(
+        self,
+        path: Path,
+        static_ttl: float,
+        volatile_ttl: float,
+        max_entries: int,
+        refresh: bool = False,
+        max_age: float | None = None,
+    ):
+        self.path = path
+        self.static_ttl = static_ttl
+        self.volatile_ttl = volatile_ttl
+        self.max_entries = max_entries
+        self.refresh = refresh
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS parts (
+                supplier TEXT NOT NULL,
+                key TEXT NOT NULL,
+                static TEXT NOT NULL,
+                volatile TEXT NOT NULL,
+                static_time REAL NOT NULL,
+                volatile_time REAL NOT NULL,
+                last_used REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (supplier, key)
+            )
+            """
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS parts_last_used ON parts (last_used)")
+        self.connection.commit()
+
+    def is_fresh(self, timestamp: float, ttl: float) -> bool:
+        if self.max_age is not None:
+            ttl = min(ttl, self.max_age)
+        return time.time() - timestamp <= ttl
+
+    def get(self, supplier: str, key: str, volatile: bool = True) -> CacheEntry | None:
+        """Returns cached entry if it is fresh enough. Volatile data is checked only if `volatile` is set."""
+        if self.refresh:
+            return None
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT static, volatile, static_time, volatile_time FROM parts WHERE supplier = ? AND key = ?",
+                (supplier, key),
+            ).fetchone()
+            if row is None:
+                return None
+            entry = CacheEntry(json.loads(row[0]), json.loads(row[1]), row[2], row[3])
+            if not self.is_fresh(entry.static_time, self.static_ttl):
+                return None
+            if volatile and not self.is_fresh(entry.volatile_time, self.volatile_ttl):
+                return None
+            self.connection.execute(
+                "UPDATE parts SET last_used = ?, hits = hits + 1 WHERE supplier = ? AND key = ?",
+                (time.time(), supplier, key),
+            )
+            self.connection.commit()
+        return entry
+
+    def put(self, supplier: str, key: str, static: dict, volatile: dict):
+        now = time.time()
+        self.put_entry(supplier, key, CacheEntry(static, volatile, now, now))
+
+    def put_entry(self, supplier: str, key: str, entry: CacheEntry):
+        """Stores entry keeping its original timestamps."""
+        with self.lock:
+            self.connection.execute(
+                """
+                INSERT INTO parts (supplier, key, static, volatile, static_time, volatile_time, last_used, hits)
+                VALUES (?, ?, ?, ?, ?, ?, ?, 0)
+                ON CONFLICT (supplier, key) DO UPDATE SET
+                    static = excluded.static,
+                    volatile = excluded.volatile,
+                    static_time = excluded.static_time,
+                    volatile_time = excluded.volatile_time,
+                    last_used = excluded.last_used
+                """,
+                (
+                    supplier,
+                    key,
+                    json.dumps(entry.static),
+                    json.dumps(entry.volatile),
+                    entry.static_time,
+                    entry.volatile_time,
+                    time.time(),
+                ),
+            )
+            self.evict()
+            self.connection.commit()
+
+    def peek(self, supplier: str, key: str) -> CacheEntry | None:
+        """Returns cached entry regardless of its age and without counting it as used."""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT static, volatile, static_time, volatile_time FROM parts WHERE supplier = ? AND key = ?",
+                (supplier, key),
+            ).fetchone()
+        if row is None:
+            return None
+        return CacheEntry(json.loads(row[0]), json.loads(row[1]), row[2], row[3])
+
+    def usage(self, supplier: str, keys: list[str]) -> dict[str, tuple[float, float, int]]:
+        """Returns (static_time, volatile_time, hits) of every cached key from `keys`."""
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT key, static_time, volatile_time, hits FROM parts WHERE supplier = ?", (supplier,)
+            ).fetchall()
+        wanted = set(keys)
+        return {key: (static, volatile, hits) for key, static, volatile, hits in rows if key in wanted}
+
+    def entries(self) -> Iterator[tuple[str, str, CacheEntry]]:
+        """Yields all cached entries regardless of their age."""
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT supplier, key, static, volatile, static_time, volatile_time FROM parts"
+            ).fetchall()
+        for supplier, key, static, volatile, static_time, volatile_time in rows:
+            yield supplier, key, CacheEntry(json.loads(static), json.loads(volatile), static_time, volatile_time)
+
+    def evict(self):
+        """Removes least recently used entries above `max_entries`. Must be called with lock held."""
+        (count,) = self.connection.execute("SELECT COUNT(*) FROM parts").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            logger.debug(f"Evicting {excess} entries from supplier cache")
+            self.connection.execute(
+                "DELETE FROM parts WHERE rowid IN (SELECT rowid FROM parts ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+
+
+_cache: SupplierCache | None = None
+_cache_lock = threading.Lock()
+_refresh = False
+_max_age: float | None = None
+_offline_snapshot: Path | None = None
+
+
+def add_arguments(parser):
+    """Adds cache override options to subcommand parser."""
+    parser.add_argument(
+        "--refresh", action="store_true", help="Ignore cached supplier data and fetch everything again"
+    )
+    parser.add_argument(
+        "--max-age",
+        type=float,
+        dest="max_age",
+        default=None,
+        help="Maximum age of cached supplier data in hours. Overrides TTLs from config",
+    )
+    parser.add_argument(
+        "--offline-snapshot",
+        type=Path,
+        dest="offline_snapshot",
+        default=None,
+        help="Serve all supplier lookups from snapshot file created by 'mems suppliers snapshot export'",
+    )
+
+
+def configure(args):
+    """Applies cache override options parsed by `add_arguments`."""
+    global _refresh, _max_age, _offline_snapshot
+    _refresh = getattr(args, "refresh", False)
+    _offline_snapshot = getattr(args, "offline_snapshot", None)
+    max_age = getattr(args, "max_age", None)
+    _max_age = max_age * 3600 if max_age is not None else None
+    if _cache is not None:
+        _cache.refresh = _refresh
+        _cache.max_age = _max_age
+
+
+def get_offline_snapshot() -> Path | None:
+    """Returns snapshot path if lookups should be served offline from it."""
+    return _offline_snapshot
+
+
+def get_cache() -> SupplierCache:
+    """Returns process wide cache, creating it from config on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            config = utils.get_config().get("cache", {})
+            _cache = SupplierCache(
+                utils.get_data_dir() / CACHE_FILENAME,
+                static_ttl=float(config.get("static_ttl_days", DEFAULT_STATIC_TTL_DAYS)) * 24 * 3600,
+                volatile_ttl=float(config.get("volatile_ttl_hours", DEFAULT_VOLATILE_TTL_HOURS)) * 3600,
+                max_entries=int(config.get("max_entries", DEFAULT_MAX_ENTRIES)),
+                refresh=_refresh,
+                max_age=_max_age,
+            )
+        return _cache
+
+
+def part_to_entry(part: Part) -> tuple[dict, dict]:
+    data = dataclasses.asdict(part)
+    volatile = {name: data.pop(name) for name in VOLATILE_FIELDS}
+    return data, volatile
+
+
+def part_from_entry(entry: CacheEntry) -> Part:
+    data = entry.static | entry.volatile
+    data["price_breaks"] = [PriceBreak(**price_break) for price_break in data["price_breaks"]]
+    return Part(**data)
@@ -0,0 +1,101 @@
+import argparse
+import dataclasses
+import json
+import logging
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from mems import backends, cache, net
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8765
+
+
+def add_subparser(subparsers):
+    parser = subparsers.add_parser(
+        "cache-server", help="Run HTTP server sharing supplier lookups and their cache with other machines"
+    )
+    parser.add_argument("--host", default="0.0.0.0", help="Address to listen on. Default: 0.0.0.0")
+    parser.add_argument("-p", "--port", type=int, default=DEFAULT_PORT, help=f"Port to listen on. Default: {DEFAULT_PORT}")
+    cache.add_arguments(parser)
+    net.add_arguments(parser)
+    parser.set_defaults(func=run)
+
+
+def run(args: argparse.Namespace):
+    cache.configure(args)
+    net.configure(args)
+    server = create_server(args.host, args.port)
+    logger.info(f"Supplier cache server listening on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Stopping cache server")
+    finally:
+        server.server_close()
+
+
+def create_server(host: str, port: int) -> ThreadingHTTPServer:
+    """Creates server, use port 0 to pick a free one. Lookups of this process always go directly to suppliers."""
+    backends.serve()
+    return ThreadingHTTPServer((host, port), CacheRequestHandler)
+
+
+class CacheRequestHandler(BaseHTTPRequestHandler):
+    """Handles `POST /lookup` with JSON body {"supplier": ..., "keys": [...], "volatile": bool}.
+
+    Responds with {"entries": {key: cache entry or null}}, so clients can store parts with their original age.
+    """
+
+    def do_GET(self):
+        if self.path == "/health":
+            self.send_json(200, {"status": "ok", "suppliers": list(backends.BACKENDS)})
+        else:
+            self.send_json(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/lookup":
+            self.send_json(404, {"error": f"Unknown path {self.path}"})
+            return
+
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            supplier = request["supplier"]
+            keys = [str(key) for key in request["keys"]]
+            volatile = bool(request.get("volatile", True))
+        except (ValueError, KeyError, TypeError) as e:
+            self.send_json(400, {"error": f"Invalid request: {e}"})
+            return
+        if supplier not in backends.BACKENDS:
+            self.send_json(400, {"error": f"Unknown supplier {supplier}"})
+            return
+
+        try:
+            parts = backends.lookup(supplier, keys, volatile=volatile)
+        except (Exception, SystemExit) as e:
+            logger.error(f"Lookup of {supplier} {keys} failed: {e!r}")
+            self.send_json(502, {"error": f"Lookup failed: {e!r}"})
+            return
+
+        # Times of the entries parts were served from, which may be offline snapshot instead of cache
+        times = backends.served_times(supplier, keys, volatile=volatile)
+        entries = {}
+        for key, part in parts.items():
+            entry = None
+            if part is not None:
+                static_time, volatile_time = times.get(key) or (time.time(), time.time())
+                entry = cache.CacheEntry(*cache.part_to_entry(part), static_time, volatile_time)
+            entries[key] = dataclasses.asdict(entry) if entry is not None else None
+        self.send_json(200, {"entries": entries})
+
+    def send_json(self, status: int, data: dict):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
@@ -5,10 +5,12 @@ import csv
 import numpy as np
 import colorama
 import termcolor
-from mems import utils
+from mems import backends, cache, net, optimizer, utils
 
 
 def run(args):
+    cache.configure(args)
+    net.configure(args)
     Consolidate(args).run()
 
 
@@ -33,6 +35,13 @@ def add_subparser(subparsers):
         dest="vendor",
         help="Vendor to be processed",
     )
+    parser.add_argument(
+        "--optimize",
+        action="store_true",
+        help="Raise order quantities to MOQ or to a higher price break when it lowers the total cost",
+    )
+    cache.add_arguments(parser)
+    net.add_arguments(parser)
     parser.set_defaults(func=run)
 
 
@@ -127,10 +136,36 @@ class Consolidate:
                     self.bom[part]["board_needs"] + f' + {spare}',
                 ]
             )
+        if self.args.optimize:
+            self.optimize_orders(vendor, list_csv[1:])
         with open(f"consolidated_{vendor}.csv", "w", newline="") as csvfile:
             writer = csv.writer(csvfile)
             writer.writerows(list_csv)
 
+    def optimize_orders(self, vendor, rows):
+        """Replaces quantities and prices in rows with the cheapest order according to supplier price breaks."""
+        if vendor not in backends.BACKENDS:
+            self.error(f"Can't optimize orders for {vendor}, prices are known only for {list(backends.BACKENDS)}")
+            return
+        parts = backends.lookup(vendor, [row[1] for row in rows])
+        offers = [
+            optimizer.Offer(line, vendor, row[1], part)
+            for line, row in enumerate(rows)
+            if (part := parts[row[1]]) is not None
+        ]
+        orders = optimizer.choose_orders(offers, [int(row[2]) for row in rows])
+        for row, order in zip(rows, orders):
+            if order is None:
+                self.error(f"No price for {row[1]}, order quantity not optimized")
+                continue
+            if order.quantity > row[2]:
+                row[7] += f" + {order.quantity - int(row[2])} to reach MOQ/price break"
+            row[2] = order.quantity
+            row[3] = order.unit_price
+            row[4] = order.cost
+            row[5] = parts[row[1]].availability  # type: ignore
+            row[6] = order.in_stock
+
     def get_file_list(self):
         if self.args.path is not None and not os.path.exists(self.args.path):
             sys.exit(termcolor.colored(f"Error: Specified filename isn't correct ({self.args.path})", "red"))
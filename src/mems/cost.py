@@ -0,0 +1,162 @@
+import argparse
+import csv
+import logging
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from mems import backends, cache, net, utils
+from mems.suppliers import Part
+
+logger = logging.getLogger(__name__)
+
+
+def add_subparser(subparsers):
+    parser = subparsers.add_parser("cost", help="Cost analysis of project BOM")
+
+    subparsers = parser.add_subparsers(dest="subcommand", required=True)
+    sweep_parser = subparsers.add_parser(name="sweep", help="Total BOM cost for a range of board counts")
+    sweep_parser.add_argument(
+        "-b",
+        "--boards",
+        default="1:100",
+        help="Board counts as 'first:last' or 'first:last:step', inclusive. Default: 1:100",
+    )
+    sweep_parser.add_argument(
+        "--bom",
+        type=Path,
+        dest="bom_dir",
+        default=None,
+        help="Directory with supplier CSVs generated by 'mems release bom'. Default: fab/bom of current project",
+    )
+    sweep_parser.add_argument("-o", "--output", type=Path, default=None, help="Output CSV file. Default: stdout")
+    cache.add_arguments(sweep_parser)
+    net.add_arguments(sweep_parser)
+
+    parser.set_defaults(func=run)
+
+
+def run(args: argparse.Namespace):
+    cache.configure(args)
+    net.configure(args)
+    if args.subcommand == "sweep":
+        sweep(parse_board_range(args.boards), args.bom_dir, args.output)
+
+
+def parse_board_range(text: str) -> np.ndarray:
+    try:
+        values = [int(value) for value in text.split(":")]
+    except ValueError:
+        values = []
+    if len(values) not in [2, 3] or values[0] < 1 or values[1] < values[0]:
+        logger.error(f"Invalid board range: {text}. Expected 'first:last' or 'first:last:step'")
+        sys.exit(1)
+    step = values[2] if len(values) == 3 else 1
+    return np.arange(values[0], values[1] + 1, step)
+
+
+def get_bom_dir() -> Path:
+    pro_filename = utils.get_pro_filename()
+    if pro_filename is None:
+        sys.exit(1)
+    return pro_filename.parent / "fab" / "bom"
+
+
+def read_bom_csv(path: Path) -> list[tuple[str, int]]:
+    """Returns (SKU, quantity per board) for every line of supplier CSV generated by BOM."""
+    lines = []
+    with open(path, newline="") as csvfile:
+        for row in csv.reader(csvfile, delimiter=";"):
+            if len(row) < 3 or row[1] == "SKU":
+                continue
+            lines.append((row[1], int(row[2])))
+    return lines
+
+
+def price_break_arrays(parts: list[Part]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Packs price breaks of parts into padded 2D arrays.
+
+    Returns break quantities (padded with inf), unit prices and minimum order quantities.
+    """
+    width = max((len(part.price_breaks) for part in parts), default=0)
+    quantities = np.full((len(parts), max(width, 1)), np.inf)
+    prices = np.zeros((len(parts), max(width, 1)))
+    min_order = np.zeros(len(parts))
+    for row, part in enumerate(parts):
+        for column, price_break in enumerate(part.price_breaks):
+            quantities[row, column] = price_break.quantity
+            prices[row, column] = price_break.price_pln
+        min_order[row] = part.min_order_qty
+    return quantities, prices, min_order
+
+
+def unit_prices(quantities: np.ndarray, prices: np.ndarray, ordered: np.ndarray) -> np.ndarray:
+    """Returns unit price for every ordered amount. `ordered` has one row per part, with any number of columns.
+
+    Amounts below the first price break get the first break price.
+    """
+    # Index of the highest price break not above ordered amount, for every part and amount at once
+    index = np.maximum((quantities[:, None, :] <= ordered[:, :, None]).sum(axis=2) - 1, 0)
+    return np.take_along_axis(prices, index, axis=1)
+
+
+def ordered_amounts(needed: np.ndarray, quantities: np.ndarray, min_order: np.ndarray) -> np.ndarray:
+    """Returns amounts that have to be ordered, with needed amounts raised to MOQ and the first price break.
+
+    `needed` has one row per part, with any number of columns.
+    """
+    return np.maximum(needed, np.maximum(min_order, quantities[:, 0])[:, None])
+
+
+def line_costs(per_board: np.ndarray, parts: list[Part], boards: np.ndarray) -> np.ndarray:
+    """Returns cost of every BOM line (rows) for every board count (columns).
+
+    Orders are raised to MOQ and the first price break, the same as in `optimizer.choose_orders`.
+    """
+    quantities, prices, min_order = price_break_arrays(parts)
+    ordered = ordered_amounts(per_board[:, None] * boards[None, :], quantities, min_order)
+    return ordered * unit_prices(quantities, prices, ordered)
+
+
+def sweep(boards: np.ndarray, bom_dir: Path | None, output: Path | None):
+    if bom_dir is None:
+        bom_dir = get_bom_dir()
+
+    supplier_costs = {}
+    for supplier in backends.BACKENDS:
+        path = bom_dir / (supplier + ".csv")
+        if not path.exists():
+            continue
+        lines = read_bom_csv(path)
+        parts = backends.lookup(supplier, [sku for sku, _ in lines])
+        priced = [(sku, quantity) for sku, quantity in lines if parts[sku] is not None and parts[sku].price_breaks]
+        for sku, _ in lines:
+            if parts[sku] is None or not parts[sku].price_breaks:
+                logger.error(f"No price for {supplier} {sku}. It is not included in the total")
+        per_board = np.array([quantity for _, quantity in priced], dtype=float)
+        costs = line_costs(per_board, [parts[sku] for sku, _ in priced], boards)  # type: ignore
+        supplier_costs[supplier] = costs.sum(axis=0)
+
+    if not supplier_costs:
+        logger.error(f"No priced supplier BOMs found in {bom_dir}. Run 'mems release bom' first")
+        sys.exit(1)
+
+    total = np.sum(list(supplier_costs.values()), axis=0)
+    header = ["Boards", "Total [zł]", "Per board [zł]"] + [f"{supplier} [zł]" for supplier in supplier_costs]
+    rows = [
+        [int(count), round(total[i], 2), round(total[i] / count, 4)]
+        + [round(costs[i], 2) for costs in supplier_costs.values()]
+        for i, count in enumerate(boards)
+    ]
+
+    if output is None:
+        writer = csv.writer(sys.stdout, delimiter=";")
+        writer.writerow(header)
+        writer.writerows(rows)
+    else:
+        with open(output, "w", newline="") as csvfile:
+            writer = csv.writer(csvfile, delimiter=";")
+            writer.writerow(header)
+            writer.writerows(rows)
+        logger.info(f"Cost sweep written to {output}")
@@ -0,0 +1,209 @@
+import argparse
+import hashlib
+import json
+import logging
+import random
+import sys
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import kiutils.symbol
+import requests
+
+from mems import net, utils
+from mems.library import lib_utils
+from mems.release import schematic
+
+logger = logging.getLogger(__name__)
+
+STORE_DIRNAME = "datasheets"
+INDEX_FILENAME = "index.json"
+DEFAULT_JOBS = 8
+CHUNK_SIZE = 64 * 1024
+# Download attempts of single datasheet. Every attempt continues from what previous ones downloaded.
+MAX_ATTEMPTS = 5
+
+
+def add_subparser(subparsers):
+    parser = subparsers.add_parser("datasheets", help="Local cache of component datasheets")
+
+    subparsers = parser.add_subparsers(dest="subcommand", required=True)
+    sync_parser = subparsers.add_parser(
+        name="sync", help="Download datasheets of installed libraries, or of current project with --project"
+    )
+    sync_parser.add_argument(
+        "--project", action="store_true", help="Download datasheets used in schematic of current project"
+    )
+    sync_parser.add_argument("urls", nargs="*", help="Additional datasheet URLs to download")
+    sync_parser.add_argument(
+        "-j", "--jobs", type=int, default=DEFAULT_JOBS, help=f"Parallel downloads. Default: {DEFAULT_JOBS}"
+    )
+    net.add_arguments(sync_parser)
+
+    lookup_parser = subparsers.add_parser(name="lookup", help="Print local path of datasheet")
+    lookup_parser.add_argument("url", help="Datasheet URL, as in Datasheet field of symbol")
+    lookup_parser.add_argument("--fetch", action="store_true", help="Download datasheet if it isn't stored yet")
+    net.add_arguments(lookup_parser)
+
+    parser.set_defaults(func=run)
+
+
+def run(args: argparse.Namespace):
+    net.configure(args)
+    store = DatasheetStore(utils.get_data_dir() / STORE_DIRNAME)
+    if args.subcommand == "sync":
+        urls = project_urls() if args.project else library_urls()
+        sync(store, urls + args.urls, args.jobs)
+    if args.subcommand == "lookup":
+        path = store.lookup(args.url)
+        if path is None and args.fetch:
+            path = store.download(args.url)
+        if path is None:
+            logger.error(f"Datasheet {args.url} is not stored. Run 'mems datasheets sync' or use --fetch")
+            sys.exit(1)
+        print(path)
+
+
+class DatasheetStore:
+    """Content addressed datasheet files, with index from URL to SHA256 of content.
+
+    Files live in `objects/<sha[:2]>/<sha><suffix>`, so the same datasheet linked from many URLs is stored once.
+    Unfinished downloads are kept in `partial/` and continued by the next attempt.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.index_path = path / INDEX_FILENAME
+        self.lock = threading.Lock()
+        (path / "objects").mkdir(parents=True, exist_ok=True)
+        (path / "partial").mkdir(parents=True, exist_ok=True)
+        self.index: dict[str, str] = self.read_index()
+
+    def read_index(self) -> dict[str, str]:
+        try:
+            with open(self.index_path) as file:
+                return json.load(file)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def save_index(self):
+        """Writes index merged with changes of other processes. Must be called with lock held."""
+        self.index = self.read_index() | self.index
+        tmp_path = self.index_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as file:
+            json.dump(self.index, file, indent=1, sort_keys=True)
+        tmp_path.replace(self.index_path)
+
+    def lookup(self, url: str) -> Path | None:
+        """Returns path of stored datasheet or None if it wasn't downloaded."""
+        with self.lock:
+            name = self.index.get(url.strip())
+        if name is None:
+            return None
+        path = self.path / "objects" / name[:2] / name
+        return path if path.exists() else None
+
+    def download(self, url: str) -> Path | None:
+        """Downloads datasheet, continuing partial download if there is one. Returns None if it failed."""
+        url = url.strip()
+        partial = self.path / "partial" / hashlib.sha256(url.encode()).hexdigest()
+        for attempt in range(MAX_ATTEMPTS):
+            try:
+                content_type = self.fetch(url, partial)
+                break
+            except requests.RequestException as e:
+                if attempt + 1 == MAX_ATTEMPTS:
+                    logger.error(f"Couldn't download {url}: {e}")
+                    return None
+                delay = random.uniform(0, min(net.MAX_RETRY_DELAY, net.RETRY_DELAY * 2 ** (attempt + 1)))
+                logger.warning(f"Download of {url} interrupted: {e}. Resuming in {delay:.1f}s")
+                time.sleep(delay)
+
+        digest = hashlib.sha256()
+        with open(partial, "rb") as file:
+            while chunk := file.read(CHUNK_SIZE):
+                digest.update(chunk)
+        name = digest.hexdigest() + file_suffix(url, content_type)
+        path = self.path / "objects" / name[:2] / name
+        if path.exists():
+            logger.debug(f"{url} has the same content as already stored {name}")
+            partial.unlink()
+        else:
+            path.parent.mkdir(exist_ok=True)
+            partial.replace(path)
+
+        with self.lock:
+            self.index[url] = name
+            self.save_index()
+        return path
+
+    def fetch(self, url: str, partial: Path) -> str:
+        """Downloads `url` into `partial`, appending to it if server supports ranges. Returns content type."""
+        offset = partial.stat().st_size if partial.exists() else 0
+        headers = {"Range": f"bytes={offset}-"} if offset > 0 else {}
+        with net.get_session(url).get(url, headers=headers, stream=True, timeout=net.TIMEOUT) as r:
+            if r.status_code == 416:
+                # Everything was downloaded before, only renaming didn't happen
+                return r.headers.get("Content-Type", "")
+            r.raise_for_status()
+            mode = "ab" if r.status_code == 206 else "wb"
+            if offset > 0:
+                logger.debug(f"Resuming {url} from {offset} B" if mode == "ab" else f"Restarting {url}")
+            with open(partial, mode) as file:
+                for chunk in r.iter_content(CHUNK_SIZE):
+                    file.write(chunk)
+            return r.headers.get("Content-Type", "")
+
+
+def file_suffix(url: str, content_type: str) -> str:
+    if "pdf" in content_type:
+        return ".pdf"
+    if "html" in content_type:
+        return ".html"
+    return Path(urllib.parse.urlsplit(url).path).suffix.lower()
+
+
+def is_url(text: str | None) -> bool:
+    return text is not None and urllib.parse.urlsplit(text.strip()).scheme in ["http", "https"]
+
+
+def library_urls() -> list[str]:
+    """Returns datasheet URLs of all symbols in installed library."""
+    path = lib_utils.get_lib_path()
+    if path is None:
+        logger.error("Library is not installed. Install with 'mems library install <path>'")
+        sys.exit(1)
+    urls = []
+    for sym_path in sorted((path / "symbols").glob("*.kicad_sym")):
+        logger.debug(f"Reading datasheets from {sym_path}")
+        for symbol in kiutils.symbol.SymbolLib.from_file(str(sym_path)).symbols:
+            urls.extend(prop.value for prop in symbol.properties if prop.key == "Datasheet" and is_url(prop.value))
+    return urls
+
+
+def project_urls() -> list[str]:
+    """Returns datasheet URLs of all components in schematic of current project."""
+    path = utils.get_main_sch_filename()
+    if path is None:
+        sys.exit(1)
+    urls = [component.properties.get("Datasheet") for component in schematic.read_components(path)]
+    return [url for url in urls if is_url(url)]  # type: ignore
+
+
+def sync(store: DatasheetStore, urls: list[str], jobs: int):
+    urls = list(dict.fromkeys(url.strip() for url in urls))
+    missing = [url for url in urls if store.lookup(url) is None]
+    logger.info(f"{len(urls)} datasheets referenced, {len(missing)} not stored yet")
+    if not missing:
+        return
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        results = list(executor.map(store.download, missing))
+    failed = sum(path is None for path in results)
+    logger.info(f"Downloaded {len(missing) - failed} datasheets to {store.path}")
+    if failed:
+        logger.error(f"{failed} datasheets couldn't be downloaded")
+        sys.exit(1)
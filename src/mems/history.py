@@ -0,0 +1,100 @@
+import datetime
+import fcntl
+import logging
+import time
+from pathlib import Path
+
+import numpy as np
+
+from mems import snapshot, utils
+from mems.suppliers import Part
+
+logger = logging.getLogger(__name__)
+
+HISTORY_DIRNAME = "history"
+# One sample per looked up part. Files are plain arrays of these records, one file per month.
+RECORD = np.dtype(
+    [
+        ("time", "<f8"),
+        ("key", "<u8"),  # snapshot.key_hash of supplier and key
+        ("availability", "<i8"),  # -1 if unknown
+        ("price", "<f4"),  # unit price at first price break, NaN if unknown
+        ("best_price", "<f4"),  # unit price at highest price break, NaN if unknown
+    ]
+)
+
+
+def get_history_dir() -> Path:
+    path = utils.get_data_dir() / HISTORY_DIRNAME
+    path.mkdir(exist_ok=True)
+    return path
+
+
+def month_path(timestamp: float) -> Path:
+    return get_history_dir() / (datetime.datetime.fromtimestamp(timestamp).strftime("%Y-%m") + ".bin")
+
+
+def key_id(supplier: str, key: str) -> int:
+    return int.from_bytes(snapshot.key_hash(supplier, key.strip()), "little")
+
+
+def record(supplier: str, parts: dict[str, Part | None]):
+    """Appends sample of every found part to history file of current month."""
+    found = [(key, part) for key, part in parts.items() if part is not None]
+    if not found:
+        return
+    now = time.time()
+    samples = np.zeros(len(found), dtype=RECORD)
+    samples["time"] = now
+    samples["key"] = [key_id(supplier, key) for key, _ in found]
+    samples["availability"] = [-1 if part.availability is None else part.availability for _, part in found]
+    samples["price"] = [part.price_breaks[0].price_pln if part.price_breaks else np.nan for _, part in found]
+    samples["best_price"] = [part.price_breaks[-1].price_pln if part.price_breaks else np.nan for _, part in found]
+
+    # Lock, so that records of processes appending at the same time don't interleave
+    with open(month_path(now), "ab") as file:
+        fcntl.flock(file, fcntl.LOCK_EX)
+        try:
+            file.write(samples.tobytes())
+        finally:
+            fcntl.flock(file, fcntl.LOCK_UN)
+
+
+def open_month(path: Path) -> np.ndarray:
+    """Maps history file into memory, ignoring incomplete record at the end if writing was interrupted."""
+    count = path.stat().st_size // RECORD.itemsize
+    if count == 0:
+        return np.zeros(0, dtype=RECORD)
+    return np.memmap(path, dtype=RECORD, mode="r", shape=(count,))
+
+
+def query(keys: list[tuple[str, str]], since: str | None = None) -> np.ndarray:
+    """Returns samples of (supplier, key) pairs, oldest first. `since` is first month as YYYY-MM."""
+    ids = np.array([key_id(supplier, key) for supplier, key in keys], dtype="<u8")
+    results = []
+    for path in sorted(get_history_dir().glob("*.bin")):
+        if since is not None and path.stem < since:
+            continue
+        data = open_month(path)
+        # Only key column is scanned, records are copied out of the map only when they match
+        results.append(np.array(data[np.isin(data["key"], ids)]))
+    if not results:
+        return np.zeros(0, dtype=RECORD)
+    samples = np.concatenate(results)
+    return samples[np.argsort(samples["time"], kind="stable")]
+
+
+def changes(samples: np.ndarray) -> np.ndarray:
+    """Returns only samples where stock or price differs from the previous sample of the same key."""
+    if len(samples) == 0:
+        return samples
+    order = np.lexsort((samples["time"], samples["key"]))
+    by_key = samples[order]
+    keep = np.ones(len(by_key), dtype=bool)
+    same_key = by_key["key"][1:] == by_key["key"][:-1]
+    same_values = (by_key["availability"][1:] == by_key["availability"][:-1]) & np.isclose(
+        by_key["price"][1:], by_key["price"][:-1], equal_nan=True
+    )
+    keep[1:] = ~(same_key & same_values)
+    result = by_key[keep]
+    return result[np.argsort(result["time"], kind="stable")]
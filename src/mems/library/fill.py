@@ -1,7 +1,6 @@
 import os
 import sys
-import time
-from mems import utils
+from mems import backends, suppliers, utils
 import kiutils.items
 import kiutils.items.common
 import kiutils.libraries
@@ -44,6 +43,7 @@ class Library:
         # Right now it updates all components. Maybe change it so it checks whether any property needs updating
         if self.sym_lib is not None:
             print("Filling missing fields")
+            queries = []
             for symbol in self.sym_lib.symbols:
                 mouser = self.find_property(symbol, "Mouser")
                 mpn = self.find_property(symbol, "MPN")
@@ -69,42 +69,45 @@ class Library:
 
                 if mouser is not None:
                     mouser.value = mouser.value.strip()
-                    result = None
-                    while result is None:
-                        result = utils.search_mouser(mouser.value)
-                        if result["Errors"] == []:
-                            break
-                        if result["Errors"][0]["Code"] == "TooManyRequests":
-                            logger.warn("Max requests per minute reached, waiting")
-                            time.sleep(2)
-
-                    part = self.find_matching_part(result, "MouserPartNumber", mouser.value)
-                    if part is None:
-                        if not tme:
-                            logger.error(f'{symbol.entryName}: Mouser ID "{mouser.value}" not found on Mouser!')
-                        continue
+                    queries.append((symbol, "MouserPartNumber", mouser.value, tme))
                 elif mpn is not None:
                     mpn.value = mpn.value.strip()
                     if mpn.value == "NO_MPN":
                         continue
-                    result = utils.search_mouser(mpn.value)
-                    part = self.find_matching_part(result, "ManufacturerPartNumber", mpn.value)
-                    if part is None:
-                        if not tme:
-                            logger.error(f'{symbol.entryName}: MPN "{mpn.value}" not found on Mouser!')
-                        continue
+                    queries.append((symbol, "ManufacturerPartNumber", mpn.value, tme))
                 else:
                     logger.error(f"{symbol.entryName}: Both MPN and Mouser fields missing!")
                     continue
 
-                self.set_property(symbol, "MPN", part["ManufacturerPartNumber"])
+            parts = self.lookup_parts(queries)
+            for symbol, key, value, tme in queries:
+                part = parts[(key, value)]
+                if part is None:
+                    if not tme:
+                        name = "Mouser ID" if key == "MouserPartNumber" else "MPN"
+                        logger.error(f'{symbol.entryName}: {name} "{value}" not found on Mouser!')
+                    continue
+
+                self.set_property(symbol, "MPN", part.mpn)
                 self.find_property(symbol, "MPN").effects.hide = True  # type: ignore Just created so must exist
-                self.set_property(symbol, "Mouser", part["MouserPartNumber"])
+                self.set_property(symbol, "Mouser", part.sku)
                 self.find_property(symbol, "Mouser").effects.hide = True  # type: ignore Just created so must exist
-                self.set_property(symbol, "ki_description", part["Description"])
-                self.set_property(symbol, "Datasheet", part["DataSheetUrl"])
+                self.set_property(symbol, "ki_description", part.description)
+                self.set_property(symbol, "Datasheet", part.datasheet)
                 self.find_property(symbol, "Datasheet").effects.hide = True  # type: ignore Just created so must exist
 
+    def lookup_parts(self, queries) -> dict[tuple[str, str], suppliers.Part | None]:
+        """Looks up all queried parts on Mouser at once."""
+        keys = {(key, value): self.backend_key(key, value) for _, key, value, _ in queries}
+        parts = backends.lookup("Mouser", keys.values(), volatile=False)
+        return {query: parts[backend_key] for query, backend_key in keys.items()}
+
+    @staticmethod
+    def backend_key(key, value):
+        if key == "ManufacturerPartNumber":
+            return backends.mpn_key(value)
+        return value
+
     def find_property(self, symbol, name):
         return next((prop for prop in symbol.properties if prop.key == name), None)
 
@@ -122,14 +125,3 @@ class Library:
             new = kiutils.items.common.Property(key=name, value=value)
             new.effects = kiutils.items.common.Effects()
             symbol.properties.append(new)
-
-    def find_matching_part(self, response, key, value):
-        try:
-            return next(
-                (part for part in response["SearchResults"]["Parts"] if key in part and part[key] == value),
-                None,
-            )
-        except TypeError:
-            logger.error("Empty response from Mouser")
-            print(response)
-            return None
@@ -1,6 +1,7 @@
 import argparse
 from pathlib import Path
 
+from mems import cache, net
 
 import mems.library.install as install
 import mems.library.fill as fill
@@ -18,6 +19,8 @@ def add_subparser(subparsers):
     subparsers = parser.add_subparsers(dest="subcommand", required=True)
     fill_parser = subparsers.add_parser(name="fill", help="Fills in missing fields in library")
     fill_parser.add_argument("path", help="Specifies path to symbol library file")
+    cache.add_arguments(fill_parser)
+    net.add_arguments(fill_parser)
 
     install_parser = subparsers.add_parser(name="install", help="Installs library in specified directory")
     install_parser.add_argument("path", type=Path)
@@ -32,6 +35,8 @@ def add_subparser(subparsers):
 
 def run(args: argparse.Namespace):
     if args.subcommand == "fill":
+        cache.configure(args)
+        net.configure(args)
         fill.Library(args).run()
     if args.subcommand == "install":
         assert isinstance(args.path, Path)
@@ -5,7 +5,7 @@ import git
 import sys
 import pathlib
 
-from mems import consolidate, utils
+from mems import cache_server, consolidate, cost, datasheets, supplier_tools, utils
 from mems.release import release
 from mems.library import library
 from mems import templates
@@ -32,9 +32,13 @@ def main():
     )
     subparsers = parser.add_subparsers(required=True, help="Subcommand")
 
+    cache_server.add_subparser(subparsers)
     consolidate.add_subparser(subparsers)
+    cost.add_subparser(subparsers)
+    datasheets.add_subparser(subparsers)
     library.add_subparser(subparsers)
     release.add_subparser(subparsers)
+    supplier_tools.add_subparser(subparsers)
     templates.add_subparser(subparsers)
 
     args = parser.parse_args()
@@ -0,0 +1,329 @@
+import collections
+import hashlib
+import json
+import logging
+import random
+import tempfile
+import threading
+import time
+import urllib.parse
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Callable
+
+import requests
+import requests.adapters
+
+from mems import utils
+
+logger = logging.getLogger(__name__)
+
+# Connections kept open per host. Should be at least as big as highest concurrency.
+POOL_SIZE = 16
+
+# Number of lookups run at the same time per supplier, if not set in config
+DEFAULT_CONCURRENCY = {"Mouser": 2, "LCSC": 4}
+
+# Connect and read timeout of every request, in seconds
+TIMEOUT = (5.0, 30.0)
+# Failed requests are retried up to MAX_RETRIES times, after random delay up to RETRY_DELAY * 2^attempt
+MAX_RETRIES = 3
+RETRY_DELAY = 0.5
+MAX_RETRY_DELAY = 8.0
+RETRY_STATUSES = {500, 502, 503, 504}
+# Every successful request to host earns RETRY_RATIO of a retry, up to RETRY_BUDGET saved, so that retries
+# can't multiply load on a host that is failing
+RETRY_RATIO = 0.1
+RETRY_BUDGET = 10.0
+# GET requests slower than this percentile of recent latencies of host get a hedged duplicate
+HEDGE_PERCENTILE = 95
+LATENCY_SAMPLES = 100
+MIN_HEDGE_SAMPLES = 20
+# Consecutive failures after which supplier is skipped, and seconds after which it is tried again
+BREAKER_THRESHOLD = 3
+BREAKER_RESET = 60.0
+
+# Query parameters left out of recordings, so that they don't leak and recordings work with any key
+SECRET_PARAMS = {"apiKey"}
+
+_sessions: dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+_record: Path | None = None
+_replay: Path | None = None
+_hosts: dict[str, "HostStats"] = {}
+_hosts_lock = threading.Lock()
+_hedge_executor = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix="hedge")
+
+
+class NotRecorded(requests.RequestException):
+    """Raised in replay mode for requests that weren't recorded."""
+
+
+class HostStats:
+    """Recent latencies and retry budget of a single host."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies: collections.deque[float] = collections.deque(maxlen=LATENCY_SAMPLES)
+        self.retry_tokens = RETRY_BUDGET
+
+    def record(self, latency: float):
+        with self.lock:
+            self.latencies.append(latency)
+            self.retry_tokens = min(RETRY_BUDGET, self.retry_tokens + RETRY_RATIO)
+
+    def hedge_delay(self) -> float | None:
+        """Returns latency after which request should be hedged, or None if there are too few samples."""
+        with self.lock:
+            if len(self.latencies) < MIN_HEDGE_SAMPLES:
+                return None
+            latencies = sorted(self.latencies)
+        return latencies[min(len(latencies) - 1, len(latencies) * HEDGE_PERCENTILE // 100)]
+
+    def spend_retry(self) -> bool:
+        with self.lock:
+            if self.retry_tokens < 1:
+                return False
+            self.retry_tokens -= 1
+            return True
+
+
+class CircuitBreaker:
+    """Skips supplier after BREAKER_THRESHOLD consecutive failures, letting one call through every BREAKER_RESET."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened: float | None = None
+        self.trial = False
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.opened is None:
+                return True
+            if self.trial or time.monotonic() - self.opened < BREAKER_RESET:
+                return False
+            self.trial = True
+            return True
+
+    def succeeded(self):
+        with self.lock:
+            if self.opened is not None:
+                logger.info(f"{self.name} is available again")
+            self.failures = 0
+            self.opened = None
+            self.trial = False
+
+    def failed(self):
+        with self.lock:
+            self.failures += 1
+            self.trial = False
+            if self.failures >= BREAKER_THRESHOLD:
+                if self.opened is None:
+                    logger.error(
+                        f"{self.name} failed {self.failures} times in a row, skipping it for {BREAKER_RESET:.0f}s"
+                    )
+                self.opened = time.monotonic()
+
+
+class RecordingAdapter(requests.adapters.HTTPAdapter):
+    """Sends requests normally and saves every response to directory, for later replay."""
+
+    def __init__(self, directory: Path, **kwargs):
+        super().__init__(**kwargs)
+        self.directory = directory
+
+    def send(self, request, *args, **kwargs):
+        response = super().send(request, *args, **kwargs)
+        path = recording_path(self.directory, request)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        recording = {
+            "method": request.method,
+            "url": public_url(request.url),
+            "status": response.status_code,
+            "content_type": response.headers.get("Content-Type", ""),
+            "content": response.text,
+        }
+        # Hedged duplicates of the same request are recorded at the same time, so each needs its own temporary file
+        with tempfile.NamedTemporaryFile("w", dir=path.parent, suffix=".tmp", delete=False) as file:
+            json.dump(recording, file)
+        Path(file.name).replace(path)
+        return response
+
+
+class ReplayAdapter(requests.adapters.BaseAdapter):
+    """Answers requests from responses saved by `RecordingAdapter`, without touching network."""
+
+    def __init__(self, directory: Path):
+        super().__init__()
+        self.directory = directory
+
+    def send(self, request, *args, **kwargs):
+        path = recording_path(self.directory, request)
+        try:
+            with open(path) as file:
+                recording = json.load(file)
+        except FileNotFoundError:
+            raise NotRecorded(f"No recorded response for {request.method} {public_url(request.url)}")
+
+        response = requests.Response()
+        response.status_code = recording["status"]
+        response.headers["Content-Type"] = recording["content_type"]
+        response._content = recording["content"].encode()
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+def public_url(url: str | None) -> str:
+    """Returns URL without secret query parameters."""
+    parts = urllib.parse.urlsplit(url or "")
+    query = [(k, v) for k, v in urllib.parse.parse_qsl(parts.query, keep_blank_values=True) if k not in SECRET_PARAMS]
+    return urllib.parse.urlunsplit(parts._replace(query=urllib.parse.urlencode(query)))
+
+
+def recording_path(directory: Path, request: requests.PreparedRequest) -> Path:
+    """Returns file of recorded response, named by hash of method, URL (without secrets) and body."""
+    body = request.body or b""
+    if isinstance(body, str):
+        body = body.encode()
+    key = hashlib.sha256(f"{request.method} {public_url(request.url)}\n".encode() + body).hexdigest()
+    return directory / urllib.parse.urlsplit(request.url).netloc.replace(":", "_") / (key[:32] + ".json")
+
+
+def add_arguments(parser):
+    """Adds transport options to subcommand parser."""
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument(
+        "--record", type=Path, metavar="DIR", default=None, help="Save all supplier responses to DIR"
+    )
+    group.add_argument(
+        "--replay",
+        type=Path,
+        metavar="DIR",
+        default=None,
+        help="Answer supplier requests only from responses saved with --record. Combine with --refresh to skip cache",
+    )
+
+
+def configure(args):
+    """Applies transport options parsed by `add_arguments`. Must be called before first request."""
+    global _record, _replay
+    _record = getattr(args, "record", None)
+    _replay = getattr(args, "replay", None)
+    if _replay is not None and not _replay.is_dir():
+        logger.warning(f"Replay directory {_replay} doesn't exist, all supplier requests will fail")
+
+
+def get_session(url: str) -> requests.Session:
+    """Returns session shared by all requests to host of `url`, so that connections are reused."""
+    host = urllib.parse.urlsplit(url).netloc
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            logger.debug(f"Creating session for {host}")
+            session = requests.Session()
+            if _replay is not None:
+                adapter = ReplayAdapter(_replay)
+            elif _record is not None:
+                adapter = RecordingAdapter(_record, pool_connections=1, pool_maxsize=POOL_SIZE)
+            else:
+                adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[host] = session
+    return session
+
+
+def get_host_stats(url: str) -> HostStats:
+    host = urllib.parse.urlsplit(url).netloc
+    with _hosts_lock:
+        return _hosts.setdefault(host, HostStats())
+
+
+def send(method: str, url: str, stats: HostStats, **kwargs) -> requests.Response:
+    start = time.monotonic()
+    response = get_session(url).request(method, url, **kwargs)
+    stats.record(time.monotonic() - start)
+    return response
+
+
+def send_hedged(method: str, url: str, stats: HostStats, **kwargs) -> requests.Response:
+    """Sends request, and a duplicate one if the first is slower than usual. Returns the first answer."""
+    delay = stats.hedge_delay()
+    if delay is None:
+        return send(method, url, stats, **kwargs)
+
+    primary = _hedge_executor.submit(send, method, url, stats, **kwargs)
+    done, _ = wait([primary], timeout=delay)
+    if done:
+        return primary.result()
+    logger.debug(f"{method} {public_url(url)} is slower than {delay:.2f}s, sending hedged request")
+    pending = {primary, _hedge_executor.submit(send, method, url, stats, **kwargs)}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                return future.result()
+            except requests.RequestException as e:
+                error = e
+    raise error  # type: ignore
+
+
+def request(method: str, url: str, acquire: Callable[[], None] | None = None, **kwargs) -> requests.Response:
+    """Sends request with timeout, retrying connection errors, timeouts and server errors with jittered backoff.
+
+    GET requests are hedged. POST isn't, because Mouser counts every search against daily quota.
+    `acquire` is called before every attempt, so that rate limiters count retries too.
+    Raises `requests.RequestException` if all attempts failed.
+    """
+    kwargs.setdefault("timeout", TIMEOUT)
+    stats = get_host_stats(url)
+    attempt = 0
+    while True:
+        if acquire is not None:
+            acquire()
+        try:
+            if method == "GET":
+                response = send_hedged(method, url, stats, **kwargs)
+            else:
+                response = send(method, url, stats, **kwargs)
+            if response.status_code not in RETRY_STATUSES:
+                return response
+            error: requests.RequestException = requests.HTTPError(
+                f"{response.status_code} {response.reason} from {public_url(url)}", response=response
+            )
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = e
+
+        attempt += 1
+        if attempt > MAX_RETRIES or not stats.spend_retry():
+            raise error
+        delay = random.uniform(0, min(MAX_RETRY_DELAY, RETRY_DELAY * 2**attempt))
+        logger.warning(f"{method} {public_url(url)} failed: {error}. Retrying in {delay:.1f}s")
+        time.sleep(delay)
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
+
+
+def endpoint(name: str, default: str) -> str:
+    """Returns URL of supplier endpoint, overridable in "endpoints" section of config (e.g. to use local stub)."""
+    return utils.get_config().get("endpoints", {}).get(name, default)
+
+
+def get_concurrency(supplier: str) -> int:
+    """Returns number of concurrent lookups allowed for supplier, configured in "concurrency" section of config."""
+    config = utils.get_config().get("concurrency", {})
+    return max(1, int(config.get(supplier, DEFAULT_CONCURRENCY.get(supplier, 1))))
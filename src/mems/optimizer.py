@@ -0,0 +1,75 @@
+import dataclasses
+import logging
+
+import numpy as np
+
+from mems import cost
+from mems.suppliers import Part
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass
+class Offer:
+    line: int
+    supplier: str
+    sku: str
+    part: Part
+
+
+@dataclasses.dataclass
+class Order:
+    supplier: str
+    sku: str
+    quantity: int
+    unit_price: float
+    cost: float
+    in_stock: bool
+
+
+def choose_orders(offers: list[Offer], needed: list[int]) -> list[Order | None]:
+    """Chooses cheapest offer and order quantity for every line, considering price breaks and MOQ.
+
+    Ordering more than needed is chosen if reaching a higher price break makes the total lower. Offers with
+    enough stock are preferred over cheaper ones without it. Lines without any priced offer get None.
+    """
+    orders: list[Order | None] = [None] * len(needed)
+    offers = [offer for offer in offers if offer.part.price_breaks]
+    if not offers:
+        return orders
+
+    quantities, prices, min_order = cost.price_break_arrays([offer.part for offer in offers])
+    lines = np.array([offer.line for offer in offers])
+    line_needed = np.array(needed, dtype=float)[lines]
+
+    # Candidates: needed amount raised to MOQ and first break, and every price break above it
+    base = cost.ordered_amounts(line_needed[:, None], quantities, min_order)[:, 0]
+    candidates = np.concatenate([base[:, None], quantities], axis=1)
+    candidates = np.where(candidates >= base[:, None], candidates, np.inf)
+    unit = cost.unit_prices(quantities, prices, np.where(np.isfinite(candidates), candidates, 0))
+    totals = np.where(np.isfinite(candidates), candidates * unit, np.inf)
+
+    # Cheapest candidate in stock if offer has any, cheapest one overall otherwise
+    availability = np.array([-1 if offer.part.availability is None else offer.part.availability for offer in offers])
+    stocked = np.isfinite(candidates) & (candidates <= availability[:, None])
+    in_stock = stocked.any(axis=1)
+    best = np.where(in_stock, np.argmin(np.where(stocked, totals, np.inf), axis=1), np.argmin(totals, axis=1))
+    rows = np.arange(len(offers))
+    best_quantity = candidates[rows, best]
+    best_unit = unit[rows, best]
+    best_total = totals[rows, best]
+
+    # Sort by line, then stock, then cost, so that the first offer of each line is the best one
+    order = np.lexsort((best_total, ~in_stock, lines))
+    _, first = np.unique(lines[order], return_index=True)
+    for index in order[first]:
+        offer = offers[index]
+        orders[offer.line] = Order(
+            offer.supplier,
+            offer.sku,
+            int(best_quantity[index]),
+            float(best_unit[index]),
+            float(best_total[index]),
+            bool(in_stock[index]),
+        )
+    return orders
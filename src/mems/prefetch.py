@@ -0,0 +1,111 @@
+import csv
+import logging
+import math
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from mems import backends, cache, net, ratelimit
+
+logger = logging.getLogger(__name__)
+
+# Requests per day left for interactive runs if --reserve isn't given
+DEFAULT_RESERVE = 200
+
+
+def find_csvs(paths: list[Path], supplier: str | None) -> list[tuple[str, Path]]:
+    """Returns (supplier, CSV) for every given file, or supplier CSVs in fab/bom of every given project directory.
+
+    Supplier is taken from file name (`Mouser.csv`, `consolidated_Mouser.csv`) unless `supplier` is given.
+    """
+    files = []
+    for path in paths:
+        if path.is_dir():
+            bom_dir = path / "fab" / "bom" if (path / "fab" / "bom").is_dir() else path
+            files.extend(sorted(bom_dir.glob("*.csv")))
+        elif path.exists():
+            files.append(path)
+        else:
+            logger.error(f"File {path} doesn't exist")
+            sys.exit(1)
+
+    csvs = []
+    for file in files:
+        name = supplier or file.stem.removeprefix("consolidated_")
+        if name not in backends.BACKENDS:
+            logger.debug(f"Skipping {file}, {name} is not a supplier with lookups")
+            continue
+        csvs.append((name, file))
+    return csvs
+
+
+def read_skus(path: Path) -> list[str]:
+    """Returns SKUs from supplier CSV generated by BOM (';' separated) or consolidated CSV (',' separated)."""
+    with open(path, newline="") as csvfile:
+        content = csvfile.read()
+    delimiter = ";" if ";" in content.partition("\n")[0] else ","
+    rows = csv.reader(content.splitlines(), delimiter=delimiter)
+    return [row[1].strip() for row in rows if len(row) > 1 and row[1].strip() and row[1] != "SKU"]
+
+
+def stale_keys(supplier: str, keys: list[str]) -> list[str]:
+    """Returns keys whose cached data is missing or too old, most urgent first.
+
+    Missing keys go first, then stale ones ordered by age weighted by how often they were used.
+    """
+    store = cache.get_cache()
+    now = time.time()
+    usage = store.usage(supplier, keys)
+    scores = {}
+    for key, (static_time, volatile_time, hits) in usage.items():
+        if store.is_fresh(static_time, store.static_ttl) and store.is_fresh(volatile_time, store.volatile_ttl):
+            if not store.refresh:
+                continue
+        scores[key] = (now - min(static_time, volatile_time)) * (1 + math.log1p(hits))
+    missing = [key for key in dict.fromkeys(keys) if key not in usage]
+    return missing + sorted(scores, key=scores.__getitem__, reverse=True)
+
+
+def prefetch(csvs: list[tuple[str, Path]], reserve: int):
+    """Refreshes stale cached parts from CSVs, stopping when only `reserve` daily requests are left."""
+    skus: dict[str, list[str]] = {}
+    for supplier, path in csvs:
+        skus.setdefault(supplier, []).extend(read_skus(path))
+
+    for supplier, keys in skus.items():
+        keys = stale_keys(supplier, keys)
+        logger.info(f"{len(keys)} {supplier} parts need refreshing")
+        backend = backends.get_backend(supplier)
+        limiter = ratelimit.get_limiter(supplier)
+        chunk = backend.batch_size * net.get_concurrency(supplier)
+        done = 0
+        while done < len(keys):
+            size = chunk
+            if limiter is not None:
+                remaining = limiter.remaining_today() - reserve
+                if remaining <= 0:
+                    logger.warning(
+                        f"Stopping {supplier} prefetch with {len(keys) - done} parts left, "
+                        f"{reserve} requests of daily quota are reserved for interactive runs"
+                    )
+                    break
+                size = min(size, remaining * backend.batch_size)
+            backends.lookup(supplier, keys[done : done + size])
+            done = min(done + size, len(keys))
+            logger.info(f"Prefetched {done}/{len(keys)} {supplier} parts")
+
+
+def spawn_background(argv: list[str]):
+    """Starts the same command again as detached low priority process, without `--background`."""
+    args = [arg for arg in argv if arg != "--background"]
+    process = subprocess.Popen(
+        [sys.executable, "-m", "mems.main", *args],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+        preexec_fn=lambda: os.nice(10),
+    )
+    logger.info(f"Prefetch running in background as PID {process.pid}, progress is written to the log file")
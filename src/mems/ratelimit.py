@@ -0,0 +1,112 @@
+import contextlib
+import datetime
+import fcntl
+import json
+import logging
+import sys
+import threading
+import time
+from typing import Iterator
+
+from mems import utils
+
+logger = logging.getLogger(__name__)
+
+STATE_FILENAME = "rate_limits.json"
+LOCK_FILENAME = "rate_limits.lock"
+
+# Published API limits as (requests per minute, requests per day). Can be overridden in "rate_limits" config section
+DEFAULT_LIMITS = {"Mouser": (30, 1000)}
+# Requests per minute left unused, so that we stay just under the limit even with clock skew
+MINUTE_MARGIN = 1
+MIN_BACKOFF = 2.0
+MAX_BACKOFF = 60.0
+
+
+class RateLimiter:
+    """Request pacing shared by all processes through a state file in data directory."""
+
+    def __init__(self, name: str, per_minute: int, per_day: int):
+        self.name = name
+        self.per_minute = max(1, per_minute - MINUTE_MARGIN)
+        self.per_day = per_day
+        self.state_path = utils.get_data_dir() / STATE_FILENAME
+        self.lock_path = utils.get_data_dir() / LOCK_FILENAME
+
+    @contextlib.contextmanager
+    def state(self) -> Iterator[dict]:
+        """Yields state of this limiter with exclusive lock held. Changes are saved on exit."""
+        with open(self.lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self.state_path) as file:
+                        states = json.load(file)
+                except (FileNotFoundError, ValueError):
+                    states = {}
+                state = states.setdefault(self.name, {})
+                today = datetime.date.today().isoformat()
+                if state.get("day") != today:
+                    state["day"] = today
+                    state["day_count"] = 0
+                now = time.time()
+                state["minute"] = [timestamp for timestamp in state.get("minute", []) if now - timestamp < 60]
+                yield state
+                with open(self.state_path, "w") as file:
+                    json.dump(states, file)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def acquire(self):
+        """Blocks until request can be sent and records it. Exits if daily quota is exhausted."""
+        while True:
+            with self.state() as state:
+                if state["day_count"] >= self.per_day:
+                    logger.error(
+                        f"Daily {self.name} API quota of {self.per_day} requests is exhausted. "
+                        "Try again tomorrow or use cached data (--offline-snapshot)"
+                    )
+                    sys.exit(1)
+
+                now = time.time()
+                wait = state.get("backoff_until", 0) - now
+                if len(state["minute"]) >= self.per_minute:
+                    wait = max(wait, min(state["minute"]) + 60 - now)
+                if wait <= 0:
+                    state["minute"].append(now)
+                    state["day_count"] += 1
+                    return
+            logger.debug(f"Waiting {wait:.1f}s for {self.name} rate limit")
+            time.sleep(wait)
+
+    def rate_limited(self):
+        """Called when supplier rejected request because of rate limit. Backs off exponentially."""
+        with self.state() as state:
+            backoff = min(max(state.get("backoff", 0) * 2, MIN_BACKOFF), MAX_BACKOFF)
+            state["backoff"] = backoff
+            state["backoff_until"] = time.time() + backoff
+        logger.warning(f"{self.name} rate limit reached, backing off for {backoff:.0f}s")
+
+    def succeeded(self):
+        """Called after successful request, resets backoff."""
+        with self.state() as state:
+            if state.get("backoff", 0):
+                state["backoff"] = 0
+
+    def remaining_today(self) -> int:
+        with self.state() as state:
+            return self.per_day - state["day_count"]
+
+
+_limiters: dict[str, RateLimiter | None] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(name: str) -> RateLimiter | None:
+    """Returns rate limiter for supplier or None if it has no limits."""
+    with _limiters_lock:
+        if name not in _limiters:
+            config = utils.get_config().get("rate_limits", {}).get(name)
+            limits = (config["per_minute"], config["per_day"]) if config is not None else DEFAULT_LIMITS.get(name)
+            _limiters[name] = RateLimiter(name, *limits) if limits is not None else None
+        return _limiters[name]
@@ -6,16 +6,31 @@ import xml.etree.ElementTree as ET
 from typing import Tuple, List, Dict
 import pathlib
 import csv
-import copy
+import datetime
+import functools
+import json
 import time
-from mems import utils
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from mems import backends, cache, net, optimizer, suppliers, utils
+from mems.release import schematic
 import logging
 
 
 logger = logging.getLogger(__name__)
 
+# Seconds after which lines that already have an offer in stock stop waiting for slower suppliers
+DEFAULT_HEDGE = 10.0
+OFFERS_FILENAME = "offers.csv"
+BOM_CACHE_DIRNAME = "bom"
+# Changing format of cached components must change this, so that old entries aren't read
+BOM_CACHE_VERSION = "1"
+MAX_CACHED_BOMS = 20
+
 
 class Component:
+    # Designs have tens of thousands of components, slots keep each of them small
+    __slots__ = ("reference", "value", "mpn", "skus")
+
     def __init__(
             self,
             reference: str,
@@ -30,12 +45,16 @@ class Component:
 
 
 class ComponentGroup:
+    __slots__ = ("count", "skus")
+
     def __init__(self, skus: dict[str, str]):
         self.count: int = 1
         self.skus: dict[str, str] = skus
 
 
 class BOMEntry:
+    __slots__ = ("mpn", "sku", "quantity")
+
     def __init__(self, mpn, sku, quantity):
         self.mpn = mpn
         self.sku = sku
@@ -46,6 +65,20 @@ class BOMEntry:
 
 
 SUPPLIERS = {}
+# "Priced at" is when stock and price of the line were fetched from supplier, it decides if the line can be reused
+PRICED_CSV_HEADER = [
+    "MPN",
+    "SKU",
+    "Quantity",
+    "Price [zł/unit]",
+    "Price [zł]",
+    "In stock",
+    "Available",
+    "Priced at",
+    "Status",
+]
+# Status of line that supplier couldn't be searched for, e.g. because it failed or circuit breaker is open
+UNAVAILABLE_STATUS = "Supplier unavailable"
 
 
 class Supplier(ABC):
@@ -56,6 +89,13 @@ class Supplier(ABC):
 
     def __init__(self):
         self.components: list[BOMEntry] = list()
+        # Rows of CSV from previous run by (MPN, SKU, quantity), written again instead of looking parts up
+        self.previous_rows: dict[tuple[str, str, str], list[str]] = {}
+        self.reused = 0
+        # SKUs left unpriced because supplier couldn't be searched, as opposed to not found
+        self.skipped: set[str] = set()
+        # When stock and price of every looked up SKU were fetched from supplier
+        self.volatile_times: dict[str, float] = {}
 
     def add_components(self, components: BOMEntry):
         self.components.append(components)
@@ -64,156 +104,189 @@ class Supplier(ABC):
     def write_csv(self, csvwriter):
         return
 
-
-class MouserSupplier(Supplier, name="Mouser"):
-    def write_csv(self, csvwriter):
-        csvwriter.writerow(
-            [
-                "MPN",
-                "SKU",
-                "Quantity",
-                "Price [zł/unit]",
-                "Price [zł]",
-                "In stock",
-                "Available",
-            ]
-        )
-        for component in self.components:
-            logger.info(f"Searching Mouser for {component.sku}")
-            response = utils.search_mouser(component.sku)
-            while len(response["Errors"]) > 0:
-                time.sleep(2)
-                response = utils.search_mouser(component.sku)
-
-            part = self.find_matching_part(response, component.sku)
-            if part is not None:
-                logger.info("Found")
-                stock = self.get_availability(part)
-                price = self.mouser_get_price(part, component.quantity)
-                if price is not None:
-                    cost = price * int(component.quantity)
-                else:
-                    cost = None
-
-                if stock is not None and stock >= int(component.quantity):
-                    available = True
+    def load_previous(self, path: pathlib.Path):
+        """Reads lines of priced CSV written by previous run that are as fresh as cached stock and prices must be."""
+        store = cache.get_cache()
+        if store.refresh or not path.exists():
+            return
+        with open(path, newline="") as csvfile:
+            rows = list(csv.reader(csvfile, delimiter=";", quotechar='"'))
+        if not rows or rows[0] != PRICED_CSV_HEADER:
+            return
+        for row in rows[1:]:
+            if len(row) != len(PRICED_CSV_HEADER):
+                continue
+            try:
+                priced_at = datetime.datetime.fromisoformat(row[7]).timestamp()
+            except ValueError:
+                continue
+            if store.is_fresh(priced_at, store.volatile_ttl):
+                self.previous_rows[(row[0], row[1], row[2])] = row
+
+    def priced_at(self, sku: str) -> str:
+        """Returns when stock and price of looked up part were fetched from supplier, as local ISO time."""
+        timestamp = self.volatile_times.get(sku, time.time())
+        return datetime.datetime.fromtimestamp(timestamp).isoformat(timespec="seconds")
+
+    def previous_row(self, component: BOMEntry) -> list[str] | None:
+        return self.previous_rows.get((str(component.mpn), str(component.sku), str(component.quantity)))
+
+    def lookup_parts(self) -> list[suppliers.Part | None]:
+        """Looks up components in supplier backend. Results are in the same order as `self.components`.
+
+        Components with row in previous CSV aren't looked up and get None.
+        """
+        keys = [component.sku for component in self.components if self.previous_row(component) is None]
+        parts = backends.lookup(self.name, keys) if keys else {}
+        self.skipped = backends.skipped(self.name, keys)
+        self.volatile_times = {key: times[1] for key, times in backends.served_times(self.name, keys).items()}
+        return [parts.get(component.sku) for component in self.components]
+
+    def write_previous_row(self, csvwriter, component: BOMEntry) -> bool:
+        """Writes row of component from previous CSV. Returns False if there is none."""
+        row = self.previous_row(component)
+        if row is None:
+            return False
+        if row[6] != "True":
+            logger.error(f"Not enough in stock {component.sku}")
+        csvwriter.writerow(row)
+        self.reused += 1
+        return True
+
+    def write_priced_csv(self, csvwriter):
+        """Writes components with price and stock looked up in supplier backend."""
+        csvwriter.writerow(PRICED_CSV_HEADER)
+        for component, part in zip(self.components, self.lookup_parts()):
+            if self.write_previous_row(csvwriter, component):
+                continue
+            if part is None:
+                if component.sku in self.skipped:
+                    status = UNAVAILABLE_STATUS
+                    logger.warning(f"Not priced {component.sku}, {self.name} unavailable")
                 else:
-                    logger.error("Not enough in stock")
-                    available = False
-
+                    status = "Not found"
+                    logger.error(f"Not found {component.sku}")
+                # Still has to be ordered, so it's written without price and stock
                 csvwriter.writerow(
-                    [
-                        component.mpn,
-                        component.sku,
-                        component.quantity,
-                        price,
-                        cost,
-                        stock,
-                        available,
-                    ]
+                    [component.mpn, component.sku, component.quantity, None, None, None, None, None, status]
                 )
-            else:
-                logger.error("Not found")
-
-    @staticmethod
-    def find_matching_part(response, sku):
-        for part in response["SearchResults"]["Parts"]:
-            if "MouserPartNumber" in part and part["MouserPartNumber"].strip() == sku.strip():
-                return part
-        return None
-
-    @staticmethod
-    def get_availability(part):
-        if "AvailabilityInStock" in part and part["AvailabilityInStock"] is not None:
-            return int(part["AvailabilityInStock"])
-        return None
-
-    @staticmethod
-    def mouser_get_price(part, count):
-        price_breaks = part["PriceBreaks"]
-        for price in price_breaks:
-            if int(price["Quantity"]) <= count:
-                return float(price["Price"].split()[0].replace(",", "."))
-        return None
+                continue
 
+            logger.info(f"Found {component.sku}")
+            price = part.price_at_qty(component.quantity)
+            if price is None and part.price_breaks:
+                price = part.price_breaks[0].price_pln
+            cost = price * component.quantity if price is not None else None
+            available = part.availability is not None and part.availability >= component.quantity
+            if not available:
+                logger.error(f"Not enough in stock {component.sku}")
 
-class LabSupplier(Supplier, name="Lab"):
-    def write_csv(self, csvwriter):
-        csvwriter.writerow(
-            [
-                "Name",
-                "Quantity",
-            ]
-        )
-        for component in self.components:
             csvwriter.writerow(
                 [
                     component.mpn,
+                    component.sku,
                     component.quantity,
+                    price,
+                    cost,
+                    part.availability,
+                    available,
+                    self.priced_at(component.sku),
+                    "Found",
                 ]
             )
 
 
-class TMESupplier(Supplier, name="TME"):
+class MouserSupplier(Supplier, name="Mouser"):
     def write_csv(self, csvwriter):
-
-        for component in self.components:
-            csvwriter.writerow(
-                [
-                    component.sku,
-                    component.quantity,
-                ]
-            )
+        self.write_priced_csv(csvwriter)
 
 
-class LCSCSupplier(Supplier, name="LCSC"):
+class LabSupplier(Supplier, name="Lab"):
     def write_csv(self, csvwriter):
         csvwriter.writerow(
             [
-                "MPN",
-                "SKU",
+                "Name",
                 "Quantity",
-                "Price [USD/unit]",
-                "Price [USD]",
-                "In stock",
-                "Available",
             ]
         )
         for component in self.components:
-            logger.info(f"Searching LCSC for {component.sku}")
-            part = utils.search_lcsc(component.sku)
-            if part is None:
-                logger.error("Not found")
-                continue
-
-            logger.info("Found")
-            price = part.get_price(component.quantity)
-            cost = price * component.quantity
-            available = part.in_stock_qty >= component.quantity
-            if not available:
-                logger.error("Not enough in stock")
-
             csvwriter.writerow(
                 [
                     component.mpn,
-                    component.sku,
                     component.quantity,
-                    price,
-                    cost,
-                    part.in_stock_qty,
-                    available,
                 ]
             )
 
 
+class TMESupplier(Supplier, name="TME"):
+    def write_csv(self, csvwriter):
+        self.write_priced_csv(csvwriter)
+
+
+class LCSCSupplier(Supplier, name="LCSC"):
+    def write_csv(self, csvwriter):
+        self.write_priced_csv(csvwriter)
+
 
 def add_subparser(subparsers):
     parser = subparsers.add_parser("bom", help="Generate BOM and execute BOM checks")
+    parser.add_argument(
+        "--optimize",
+        action="store_true",
+        help="Assign every component to the supplier with the lowest total cost instead of the first one with SKU",
+    )
+    parser.add_argument(
+        "--compare",
+        action="store_true",
+        help=f"Query all suppliers of every component at once, record offers in fab/bom/{OFFERS_FILENAME} and "
+        "assign every component to the best offer in stock",
+    )
+    parser.add_argument(
+        "--hedge",
+        type=float,
+        default=DEFAULT_HEDGE,
+        help="With --compare, seconds after which suppliers are chosen without waiting for slower ones, if every "
+        "component they have is in stock elsewhere. Their lookups aren't cancelled, so the run still ends only "
+        f"after they finish or time out. Default: {DEFAULT_HEDGE}",
+    )
+    parser.add_argument(
+        "--kicad-cli",
+        action="store_true",
+        dest="kicad_cli",
+        help="Read components from BOM exported by kicad-cli instead of reading schematic files directly",
+    )
+    parser.add_argument(
+        "--check-reader",
+        action="store_true",
+        dest="check_reader",
+        help="Only compare components read from schematic files with kicad-cli export and report differences",
+    )
+    parser.add_argument(
+        "--verify-only",
+        action="store_true",
+        dest="verify_only",
+        help="Only check MPNs, SKUs and supplier assignment, without looking up parts or generating CSVs",
+    )
+    cache.add_arguments(parser)
+    net.add_arguments(parser)
     parser.set_defaults(func=run)
 
 
-def run(_ = None):
-    BOM().run()
+def run(args = None):
+    if args is not None:
+        cache.configure(args)
+        net.configure(args)
+    report = BOM(
+        optimize=getattr(args, "optimize", False),
+        compare=getattr(args, "compare", False),
+        hedge=getattr(args, "hedge", DEFAULT_HEDGE),
+        kicad_cli=getattr(args, "kicad_cli", False),
+        verify_only=getattr(args, "verify_only", False),
+    )
+    if getattr(args, "check_reader", False):
+        report.check_reader()
+    else:
+        report.run()
 
 def get_filename():
     filename = utils.get_pro_filename()
@@ -224,25 +297,54 @@ def get_filename():
     return str(filename)
 
 
+def get_bom_cache_dir() -> pathlib.Path:
+    path = utils.get_data_dir() / BOM_CACHE_DIRNAME
+    path.mkdir(exist_ok=True)
+    return path
+
+
+@functools.cache
+def kicad_cli_version() -> str:
+    try:
+        result = subprocess.run(["kicad-cli", "version"], capture_output=True, text=True)
+    except FileNotFoundError:
+        return "missing"
+    return result.stdout.strip()
+
+
 class BOM:
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        optimize: bool = False,
+        compare: bool = False,
+        hedge: float = DEFAULT_HEDGE,
+        kicad_cli: bool = False,
+        verify_only: bool = False,
+    ) -> None:
         self.path = utils.get_main_sch_filename()
+        self.optimize = optimize
+        self.compare = compare
+        self.hedge = hedge
+        self.kicad_cli = kicad_cli
+        # Only structural checks, without looking up parts and writing CSVs
+        self.verify_only = verify_only
         self.components: list[Component] = []
         self.grouped_components: dict[str, ComponentGroup] = {}
         self.has_errored = False
 
     def run(self):
-        self.generate_xml_bom()
-        components = self.parse_xml()
+        components = self.read_components()
         self.verify_components(components)
         components = self.handle_multipart_components(components)
         components = self.handle_misc_components(components)
         grouped_components = self.group_components(components)
 
         suppliers = ["Mouser", "TME", "LCSC"]
-        self.generate_csv_boms(grouped_components, suppliers)
+        if self.verify_only:
+            self.assign_suppliers(grouped_components, suppliers)
+        else:
+            self.generate_csv_boms(grouped_components, suppliers)
 
-        self.remove_temp_xml()
         if self.has_errored:
             logger.error("There were issues found")
         else:
@@ -270,41 +372,127 @@ class BOM:
         )
         process.wait()
 
+    def read_components(self) -> List[Component]:
+        """Reads components from schematic files, or from kicad-cli export if that fails or was requested."""
+        if not self.kicad_cli:
+            try:
+                return self.cached_components("schematic", self.read_schematic)
+            except Exception as e:
+                logger.warning(f"Couldn't read schematic directly ({e!r}), falling back to kicad-cli")
+        return self.cached_components(f"kicad-cli {kicad_cli_version()}", self.read_kicad_cli)
+
+    def cached_components(
+        self,
+        source: str,
+        read,
+        root: pathlib.Path | None = None,
+        files: schematic.SchematicFiles | None = None,
+    ) -> List[Component]:
+        """Returns components read before from the same schematic hierarchy and source, or reads and caches them.
+
+        Key is hash of content of every sheet file, so editing any sheet invalidates the cache. Hierarchy starts at
+        `root` in `files`, or at main schematic of current project on disk.
+        """
+        if root is None and self.path is not None:
+            root = pathlib.Path(self.path)
+        if root is None:
+            return read()
+        key = schematic.fingerprint(root, BOM_CACHE_VERSION, source, *SUPPLIERS, files=files)
+        path = get_bom_cache_dir() / f"{key}.json"
+        try:
+            with open(path) as file:
+                components = [Component(*fields) for fields in json.load(file)]
+            os.utime(path)
+            logger.info(f"{root} unchanged, using {len(components)} components read before from {source}")
+            return components
+        except (FileNotFoundError, ValueError, TypeError):
+            pass
+
+        components = read()
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w") as file:
+            json.dump([[c.reference, c.value, c.mpn, c.skus] for c in components], file)
+        tmp_path.replace(path)
+        # Keep only the most recently used entries
+        entries = sorted(path.parent.glob("*.json"), key=lambda entry: entry.stat().st_mtime, reverse=True)
+        for entry in entries[MAX_CACHED_BOMS:]:
+            entry.unlink(missing_ok=True)
+        return components
+
+    def read_kicad_cli(self) -> List[Component]:
+        self.generate_xml_bom()
+        components = self.parse_xml()
+        self.remove_temp_xml()
+        return components
+
+    def read_schematic(
+        self, root: pathlib.Path | None = None, files: schematic.SchematicFiles | None = None
+    ) -> List[Component]:
+        if root is None and self.path is not None:
+            root = pathlib.Path(self.path)
+        logger.info(f"Reading components from {root}")
+        if root is None:
+            raise FileNotFoundError("Main schematic not found")
+        return [
+            self.make_component(component.reference, component.value, component.properties)
+            for component in schematic.read_components(root, files=files)
+        ]
+
     def parse_xml(self):
-        logger.info("Parsing the XML BOM")
-        tree = ET.parse(get_filename())
-        root = tree.getroot()
-        components = root.find("components")
-        if components is None:
-            return []
+        """Streams components from XML BOM, keeping only one <comp> element in memory at a time.
 
+        Parsing stops at the end of <components>, so the libparts and nets that follow are never read.
+        """
+        logger.info("Parsing the XML BOM")
         output_components = []
-        for component in components:
-            ref = component.attrib["ref"]
-            value_element = component.find("value")
-            if value_element is not None and value_element.text is not None:
-                value = value_element.text
-            else:
-                value = None
+        components = None
+        for event, element in ET.iterparse(get_filename(), events=("start", "end")):
+            if event == "start":
+                if element.tag == "components":
+                    components = element
+                continue
+            if element.tag == "components":
+                break
+            if element.tag != "comp" or components is None:
+                continue
 
-            properties = component.findall("property")
-            mpn = self.find_property(properties, "MPN")
+            value_element = element.find("value")
+            value = value_element.text if value_element is not None else None
+            properties = {
+                prop.attrib["name"]: prop.attrib["value"]
+                for prop in element.iter("property")
+                if prop.attrib.get("value", "") != ""
+            }
+            output_components.append(self.make_component(element.attrib["ref"], value, properties))
+            # Drop processed <comp> elements from the tree
+            components.clear()
 
-            skus = {}
-            for supplier in SUPPLIERS:
-                supplier_sku = self.find_property(properties, supplier)
-                if supplier_sku is not None:
-                    skus[supplier] = supplier_sku
+        return output_components
 
-            output_components.append(Component(ref, value, mpn, skus))
+    def make_component(self, reference: str, value: str | None, properties: Dict[str, str]) -> Component:
+        skus = {supplier: properties[supplier] for supplier in SUPPLIERS if supplier in properties}
+        return Component(reference, value, properties.get("MPN"), skus)
 
-        return output_components
+    def check_reader(self):
+        """Compares components read from schematic files with kicad-cli export. Exits with error on difference."""
+        native = {component.reference: component for component in self.read_schematic()}
+        self.generate_xml_bom()
+        exported = {component.reference: component for component in self.parse_xml()}
+        self.remove_temp_xml()
+
+        for reference in sorted(native.keys() - exported.keys(), key=schematic.natural_key):
+            self.error(f"{reference} read from schematic but missing in kicad-cli export")
+        for reference in sorted(exported.keys() - native.keys(), key=schematic.natural_key):
+            self.error(f"{reference} in kicad-cli export but not read from schematic")
+        for reference in sorted(native.keys() & exported.keys(), key=schematic.natural_key):
+            read = (native[reference].value, native[reference].mpn, native[reference].skus)
+            expected = (exported[reference].value, exported[reference].mpn, exported[reference].skus)
+            if read != expected:
+                self.error(f"{reference} differs: schematic {read}, kicad-cli {expected}")
 
-    def find_property(self, properties, name: str):
-        for prop in properties:
-            if prop.attrib["name"] == name:
-                return str(prop.attrib["value"])
-        return None
+        if self.has_errored:
+            sys.exit(1)
+        logger.info(f"Schematic reader matches kicad-cli export for all {len(native)} components")
 
     def verify_components(self, components: List[Component]):
         logger.info("Veryfing components")
@@ -343,12 +531,11 @@ class BOM:
                 self.error(f"Element count in SKU and MPN not equal for {component.mpn}. Ignoring this component")
                 continue
 
-            for index, (supplier, sku) in enumerate(skus):
-                new_component = copy.deepcopy(component)
-                new_component.mpn = f"{sku} from Multipart: {mpns}"
-                new_component.skus = {supplier: sku}
-
-                out_components.append(new_component)
+            # Every field but the immutable reference and value is replaced, so nothing needs copying
+            for supplier, sku in skus:
+                out_components.append(
+                    Component(component.reference, component.value, f"{sku} from Multipart: {mpns}", {supplier: sku})
+                )
 
         return out_components
 
@@ -382,22 +569,64 @@ class BOM:
     def generate_csv_boms(self, grouped_components: Dict[str, ComponentGroup], suppliers: List[str]) -> None:
         logger.info("Generating CSV BOMS")
 
+        assigned = {}
+        if self.compare:
+            assigned = self.compare_suppliers(grouped_components, suppliers)
+        elif self.optimize:
+            assigned = self.optimize_suppliers(grouped_components, suppliers)
+        boms = self.assign_suppliers(grouped_components, suppliers, assigned)
+
+        project_filename = utils.get_pro_filename()
+        if project_filename is None:
+            logger.error("No project file found")
+            sys.exit(1)
+        path = project_filename.parent / "fab" / "bom"
+        path.mkdir(parents=True, exist_ok=True)
+        # Every supplier waits for its own lookups, so they run side by side instead of adding up
+        with ThreadPoolExecutor(max_workers=len(boms)) as executor:
+            futures = [
+                executor.submit(self.write_supplier_csv, path / (name + ".csv"), bom) for name, bom in boms.items()
+            ]
+        for future in futures:
+            future.result()
+        reused = sum(bom.reused for bom in boms.values())
+        total = sum(len(bom.components) for bom in boms.values())
+        logger.info(f"Reused {reused} of {total} BOM lines from previous CSVs, looked up {total - reused}")
+
+    def assign_suppliers(
+        self,
+        grouped_components: Dict[str, ComponentGroup],
+        suppliers: List[str],
+        assigned: Dict[str, optimizer.Order] | None = None,
+    ) -> Dict[str, Supplier]:
+        """Splits components between supplier BOMs. Components not in `assigned` go to the first supplier with SKU.
+
+        Components in `assigned` are ordered in the quantity of their order, which may be raised to MOQ or price break.
+        """
+        assigned = assigned or {}
         boms: Dict[str, Supplier] = {name: SUPPLIERS[name]() for name in suppliers}
         no_supplier_mpns: List[str] = []
-
         for mpn, grouped_component in grouped_components.items():
             if mpn != "NO_MPN":
                 supplier: str | None = None
-                for sup in suppliers:
-                    if sup in grouped_component.skus and grouped_component.skus[sup] is not None:
-                        supplier = sup
-                        break
+                quantity = grouped_component.count
+                order = assigned.get(mpn)
+                if order is not None:
+                    supplier = order.supplier
+                    if order.quantity != quantity:
+                        logger.info(f"Ordering {order.quantity} instead of {quantity} pcs of {mpn} from {supplier}")
+                        quantity = order.quantity
+                else:
+                    for sup in suppliers:
+                        if sup in grouped_component.skus and grouped_component.skus[sup] is not None:
+                            supplier = sup
+                            break
 
                 if supplier is not None:
                     entry = BOMEntry(
                         mpn,
                         grouped_component.skus[supplier],
-                        grouped_component.count,
+                        quantity,
                     )
 
                     boms[supplier].add_components(entry)
@@ -406,17 +635,230 @@ class BOM:
 
         if len(no_supplier_mpns) > 0:
             self.error(f"There were {str(len(no_supplier_mpns))} components without supplier ({no_supplier_mpns})")
+        return boms
+
+    def write_supplier_csv(self, path: pathlib.Path, bom: Supplier):
+        """Writes supplier CSV to temporary file and renames it, so that interrupted run never leaves half of it."""
+        start = time.monotonic()
+        bom.load_previous(path)
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        try:
+            with open(tmp_path, "w", newline="") as csvfile:
+                csvwriter = csv.writer(csvfile, delimiter=";", quotechar='"')
+                bom.write_csv(csvwriter)
+            tmp_path.replace(path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        if bom.skipped:
+            self.error(f"{len(bom.skipped)} {bom.name} lines left unpriced, {bom.name} couldn't be searched")
+        logger.info(
+            f"{bom.name} BOM with {len(bom.components)} lines written in {time.monotonic() - start:.1f}s, "
+            f"{bom.reused} reused from previous CSV, {len(bom.components) - bom.reused} looked up"
+        )
 
+    def optimize_suppliers(
+        self, grouped_components: Dict[str, ComponentGroup], suppliers: List[str]
+    ) -> Dict[str, optimizer.Order]:
+        """Returns cheapest order for every MPN that has SKU in at least one priced supplier."""
+        logger.info("Choosing cheapest suppliers")
+        mpns = [mpn for mpn in grouped_components if mpn != "NO_MPN"]
+        offers: List[optimizer.Offer] = []
+        for supplier in suppliers:
+            if supplier not in backends.BACKENDS:
+                continue
+            lines = [(line, grouped_components[mpn].skus.get(supplier)) for line, mpn in enumerate(mpns)]
+            lines = [(line, sku) for line, sku in lines if sku is not None]
+            parts = backends.lookup(supplier, [sku for _, sku in lines])
+            for line, sku in lines:
+                part = parts[sku]
+                if part is not None:
+                    offers.append(optimizer.Offer(line, supplier, sku, part))
+
+        orders = optimizer.choose_orders(offers, [grouped_components[mpn].count for mpn in mpns])
+        return {mpn: order for mpn, order in zip(mpns, orders) if order is not None}
+
+    def compare_suppliers(
+        self, grouped_components: Dict[str, ComponentGroup], suppliers: List[str]
+    ) -> Dict[str, optimizer.Order]:
+        """Looks up all suppliers of every MPN at the same time and returns order of the best offer.
+
+        After `self.hedge` seconds, slower suppliers are no longer waited for if every MPN they have a SKU for
+        already has an offer in stock from another supplier. All offers are written to OFFERS_FILENAME.
+
+        Lookups of suppliers that weren't waited for aren't cancelled. They keep running, overlapped with writing
+        CSVs, and still fill the cache, but process exits only after they finish or time out (see `net.TIMEOUT`),
+        because the request threads are joined at exit. So the hedge only lets the rest of the run go on sooner.
+        """
+        logger.info("Comparing suppliers")
+        mpns = [mpn for mpn in grouped_components if mpn != "NO_MPN"]
+        needed = [grouped_components[mpn].count for mpn in mpns]
+        queries: Dict[str, List[Tuple[int, str]]] = {}
+        for supplier in suppliers:
+            if supplier not in backends.BACKENDS:
+                continue
+            lines = [(line, grouped_components[mpn].skus.get(supplier)) for line, mpn in enumerate(mpns)]
+            lines = [(line, sku) for line, sku in lines if sku is not None]
+            if lines:
+                queries[supplier] = lines  # type: ignore
+        if not queries:
+            return {}
+
+        start = time.monotonic()
+
+        def lookup(supplier: str):
+            keys = [sku for _, sku in queries[supplier]]
+            parts = backends.lookup(supplier, keys)
+            return parts, backends.skipped(supplier, keys), time.monotonic() - start
+
+        offers: List[optimizer.Offer] = []
+        responses: Dict[str, Dict[str, suppliers.Part | None]] = {}
+        unavailable: Dict[str, set[str]] = {}
+        executor = ThreadPoolExecutor(max_workers=len(queries))
+        futures = {executor.submit(lookup, supplier): supplier for supplier in queries}
+        pending = set(futures)
+        while pending:
+            remaining = start + self.hedge - time.monotonic()
+            done, pending = wait(pending, timeout=remaining if remaining > 0 else None, return_when=FIRST_COMPLETED)
+            for future in done:
+                supplier = futures[future]
+                parts, unavailable[supplier], latency = future.result()
+                responses[supplier] = parts
+                logger.info(f"{supplier} answered for {len(queries[supplier])} parts in {latency:.2f}s")
+                for line, sku in queries[supplier]:
+                    part = parts[sku]
+                    if part is not None:
+                        offers.append(optimizer.Offer(line, supplier, sku, part))
+
+            if pending and time.monotonic() - start >= self.hedge:
+                in_stock = {
+                    offer.line
+                    for offer in offers
+                    if offer.part.availability is not None and offer.part.availability >= needed[offer.line]
+                }
+                waiting = {line for future in pending for line, _ in queries[futures[future]]}
+                if waiting <= in_stock:
+                    slow = ", ".join(futures[future] for future in pending)
+                    logger.warning(
+                        f"{slow} didn't answer in {time.monotonic() - start:.2f}s. "
+                        "Not waiting, all their parts are in stock at other suppliers. "
+                        "Their lookups continue in background"
+                    )
+                    break
+        # Doesn't stop lookups that are still running, they only stop being waited for here
+        executor.shutdown(wait=False)
+
+        orders = optimizer.choose_orders(offers, needed)
+        self.write_offers(mpns, needed, queries, responses, unavailable, orders)
+        return {mpn: order for mpn, order in zip(mpns, orders) if order is not None}
+
+    def write_offers(
+        self,
+        mpns: List[str],
+        needed: List[int],
+        queries: Dict[str, List[Tuple[int, str]]],
+        responses: Dict[str, Dict[str, suppliers.Part | None]],
+        unavailable: Dict[str, set[str]],
+        orders: List[optimizer.Order | None],
+    ) -> None:
         project_filename = utils.get_pro_filename()
         if project_filename is None:
             logger.error("No project file found")
             sys.exit(1)
         path = project_filename.parent / "fab" / "bom"
         path.mkdir(parents=True, exist_ok=True)
-        for name, bom in boms.items():
-            with open((path / (name + ".csv")), "w+", newline="") as csvfile:
-                csvwriter = csv.writer(csvfile, delimiter=";", quotechar='"')
-                bom.write_csv(csvwriter)
+
+        rows = []
+        for supplier, lines in queries.items():
+            for line, sku in lines:
+                order = orders[line]
+                chosen = order is not None and order.supplier == supplier and order.sku == sku
+                if supplier not in responses:
+                    rows.append([mpns[line], needed[line], supplier, sku, None, None, None, None, "No response", False])
+                    continue
+                part = responses[supplier][sku]
+                if part is None:
+                    status = UNAVAILABLE_STATUS if sku in unavailable[supplier] else "Not found"
+                    rows.append([mpns[line], needed[line], supplier, sku, None, None, None, None, status, False])
+                    continue
+                price = part.price_at_qty(needed[line])
+                if price is None and part.price_breaks:
+                    price = part.price_breaks[0].price_pln
+                cost = price * needed[line] if price is not None else None
+                available = part.availability is not None and part.availability >= needed[line]
+                rows.append(
+                    [
+                        mpns[line],
+                        needed[line],
+                        supplier,
+                        sku,
+                        price,
+                        cost,
+                        part.availability,
+                        available,
+                        "Found",
+                        chosen,
+                    ]
+                )
+        rows.sort(key=lambda row: row[0])
+
+        with open(path / OFFERS_FILENAME, "w+", newline="") as csvfile:
+            csvwriter = csv.writer(csvfile, delimiter=";", quotechar='"')
+            csvwriter.writerow(
+                [
+                    "MPN",
+                    "Quantity",
+                    "Supplier",
+                    "SKU",
+                    "Price [zł/unit]",
+                    "Price [zł]",
+                    "In stock",
+                    "Available",
+                    "Status",
+                    "Chosen",
+                ]
+            )
+            csvwriter.writerows(rows)
 
     def remove_temp_xml(self):
         os.remove(get_filename())
+
+
+def synthetic_components(count: int) -> List[Component]:
+    """Returns made up design: 10% multipart components, 10% test points without MPN, the rest from 500 MPNs."""
+    components = []
+    for index in range(count):
+        if index % 10 == 0:
+            components.append(Component(f"TP{index}", None, None, {}))
+        elif index % 10 == 1:
+            components.append(Component(f"U{index}", "X", "A+B+C", {"Mouser": "M1+M2", "LCSC": "C1"}))
+        else:
+            mpn = f"MPN{index % 500}"
+            components.append(Component(f"R{index}", "10k", mpn, {"Mouser": f"M-{mpn}", "TME": f"T-{mpn}"}))
+    return components
+
+
+if __name__ == "__main__":
+    # Benchmarks multipart, misc and grouping passes: python -m mems.release.bom [component count]
+    import tracemalloc
+
+    logging.disable(logging.CRITICAL)
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    report = BOM()
+
+    tracemalloc.start()
+    components = synthetic_components(count)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    grouped = report.group_components(report.handle_misc_components(report.handle_multipart_components(components)))
+    elapsed = time.perf_counter() - start
+
+    components = synthetic_components(count)
+    tracemalloc.start()
+    report.group_components(report.handle_misc_components(report.handle_multipart_components(components)))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    print(f"{count} components ({size / 1e6:.2f} MB) -> {len(grouped)} lines")
+    print(f"Passes: {elapsed * 1000:.1f} ms, peak memory {peak / 1e6:.2f} MB")
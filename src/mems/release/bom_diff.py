@@ -0,0 +1,90 @@
+import logging
+import os
+import sys
+from pathlib import Path
+
+import git
+
+from mems import utils
+from mems.release import bom, schematic
+
+logger = logging.getLogger(__name__)
+
+
+def add_subparser(subparsers):
+    parser = subparsers.add_parser("bom-diff", help="Show how BOM changed between two git revisions")
+    parser.add_argument("rev_a", help="Old revision, e.g. tag of previous release")
+    parser.add_argument("rev_b", nargs="?", default="HEAD", help="New revision. Default: HEAD")
+    parser.set_defaults(func=run)
+
+
+def run(args):
+    try:
+        repo = git.Repo(os.getcwd(), search_parent_directories=True)
+    except git.InvalidGitRepositoryError:
+        logger.error("Not in a git repository")
+        sys.exit(1)
+    path = utils.get_main_sch_filename()
+    if path is None:
+        sys.exit(1)
+    # Path of main schematic in the repository, the same in both revisions
+    relative = Path(os.path.relpath(Path(path).resolve(), Path(repo.working_tree_dir).resolve()))
+
+    old = read_lines(repo, args.rev_a, relative)
+    new = read_lines(repo, args.rev_b, relative)
+    print_diff(old, new)
+
+
+def read_lines(repo: git.Repo, revision: str, path: Path) -> dict[str, list[str]]:
+    """Returns references of components of every BOM line (MPN) in schematic at `revision`.
+
+    Schematic files are read from git objects, working tree isn't touched.
+    """
+    try:
+        commit = repo.commit(revision)
+    except (git.BadName, ValueError):
+        logger.error(f"Unknown revision {revision}")
+        sys.exit(1)
+    logger.info(f"Reading BOM of {revision} ({commit.hexsha[:7]})")
+
+    files = schematic.GitSchematicFiles(commit)
+    report = bom.BOM(verify_only=True)
+    try:
+        components = report.cached_components(
+            "schematic", lambda: report.read_schematic(path, files), root=path, files=files
+        )
+    except FileNotFoundError as e:
+        logger.error(f"Couldn't read schematic of {revision}: {e}")
+        sys.exit(1)
+    components = report.handle_multipart_components(components)
+    components = report.handle_misc_components(components)
+
+    lines: dict[str, list[str]] = {}
+    for component in components:
+        lines.setdefault(str(component.mpn), []).append(component.reference)
+    return lines
+
+
+def format_references(references: set[str] | list[str]) -> str:
+    return ", ".join(sorted(references, key=schematic.natural_key))
+
+
+def print_diff(old: dict[str, list[str]], new: dict[str, list[str]]):
+    added = removed = changed = 0
+    for mpn in sorted(old.keys() | new.keys()):
+        before, after = old.get(mpn, []), new.get(mpn, [])
+        if not before:
+            print(f"+ {mpn}: {len(after)} ({format_references(after)})")
+            added += 1
+        elif not after:
+            print(f"- {mpn}: {len(before)} ({format_references(before)})")
+            removed += 1
+        elif len(before) != len(after):
+            details = []
+            if set(after) - set(before):
+                details.append(f"added {format_references(set(after) - set(before))}")
+            if set(before) - set(after):
+                details.append(f"removed {format_references(set(before) - set(after))}")
+            print(f"~ {mpn}: {len(before)} -> {len(after)} ({'; '.join(details)})")
+            changed += 1
+    logger.info(f"{added} lines added, {removed} removed, {changed} with changed quantity")
@@ -9,8 +9,8 @@ from importlib import resources
 
 import git
 
-from mems import utils
-from mems.release import bom
+from mems import cache, net, utils
+from mems.release import bom, bom_diff
 
 logger = logging.getLogger(__name__)
 
@@ -22,25 +22,40 @@ def add_subparser(subparsers):
 
     all_parser = subparsers.add_parser(name="all", help="Create a new release. To be used when ordering boards")
     all_parser.add_argument("revision", help="Revision name to tag the outputs, e.g. 1.0")
+    cache.add_arguments(all_parser)
+    net.add_arguments(all_parser)
 
     variables_parser = subparsers.add_parser(name="variables", help="Fill in release variables such as SHA, date and revision")
     variables_parser.add_argument("revision", help="Revision name to tag the outputs, e.g. 1.0")
 
-    _ = subparsers.add_parser(name="check", help="Perform checks that need to pass for release")
+    check_parser = subparsers.add_parser(name="check", help="Perform checks that need to pass for release")
+    check_parser.add_argument(
+        "--price-bom",
+        action="store_true",
+        dest="price_bom",
+        help="Also look up BOM parts at suppliers and generate CSVs, like 'mems release bom'",
+    )
+    cache.add_arguments(check_parser)
+    net.add_arguments(check_parser)
     _ = subparsers.add_parser(name="jlcpcb", help="Generate outputs for JLCPCB pcb fabrication")
     _ = subparsers.add_parser(name="pdf", help="Generate schematic pdf")
 
     bom.add_subparser(subparsers)
+    bom_diff.add_subparser(subparsers)
 
     parser.set_defaults(func=run)
 
 def run(args) -> None:
+    cache.configure(args)
+    net.configure(args)
     if args.subcommand == "set_variables":
         set_variables(args.revision)
     if args.subcommand == "check":
-        check()
+        check(verify_only=not args.price_bom)
     if args.subcommand == "bom":
-        bom.run()
+        bom.run(args)
+    if args.subcommand == "bom-diff":
+        bom_diff.run(args)
     if args.subcommand == "all":
         run_all(args)
     if args.subcommand == "jlcpcb":
@@ -62,7 +77,7 @@ def set_sha(repo: git.Repo):
     utils.set_text_variable("sha", sha)
 
 
-def check(clean=True):
+def check(clean=True, verify_only=True):
     ok = True
     pro_file = utils.get_pro_filename()
     if pro_file is None:
@@ -89,7 +104,7 @@ def check(clean=True):
         logger.info("DRC passed")
 
     logger.info("Running BOM Check")
-    bom_obj = bom.BOM()
+    bom_obj = bom.BOM(verify_only=verify_only)
     bom_obj.run()
     
     if bom_obj.has_errored:
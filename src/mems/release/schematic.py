@@ -0,0 +1,197 @@
+import dataclasses
+import hashlib
+import logging
+import os
+import re
+from pathlib import Path
+
+import git
+import kiutils.schematic
+from kiutils.items.schitems import SchematicSymbol
+from kiutils.utils import sexpr
+
+logger = logging.getLogger(__name__)
+
+# Sheet file property of hierarchical sheets, "Sheet file" in KiCad 6 and "Sheetfile" since KiCad 7
+SHEET_FILE_PATTERN = re.compile(rb'\(property\s+"Sheet ?file"\s+"((?:[^"\\]|\\.)*)"')
+
+
+@dataclasses.dataclass
+class SchematicComponent:
+    reference: str
+    value: str | None
+    properties: dict[str, str]
+    unit: int = 1
+
+
+class SchematicFiles:
+    """Schematic files on disk."""
+
+    def normalize(self, path: Path) -> Path:
+        return path.resolve()
+
+    def read_bytes(self, path: Path) -> bytes:
+        return path.read_bytes()
+
+
+class GitSchematicFiles(SchematicFiles):
+    """Schematic files of git commit, read from object store without checking them out.
+
+    Paths are relative to repository root.
+    """
+
+    def __init__(self, commit: git.Commit):
+        self.commit = commit
+
+    def normalize(self, path: Path) -> Path:
+        return Path(os.path.normpath(path))
+
+    def read_bytes(self, path: Path) -> bytes:
+        try:
+            blob = self.commit.tree / self.normalize(path).as_posix()
+        except KeyError:
+            raise FileNotFoundError(f"{path} doesn't exist in {self.commit.hexsha[:7]}") from None
+        return blob.data_stream.read()
+
+
+def natural_key(reference: str) -> list:
+    """Sort key ordering R2 before R10, like KiCad does."""
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", reference)]
+
+
+class SchematicReader:
+    """Reads components from .kicad_sch hierarchy, without running kicad-cli.
+
+    Every file is parsed once, even if it is used by many sheets. Symbols get reference of the sheet instance
+    they are in, units of multi-unit symbols are merged into one component and symbols excluded from BOM or
+    with references starting with '#' (power symbols) are skipped, the same as in kicad-cli BOM export.
+    """
+
+    def __init__(self, root: Path, project: str | None = None, files: SchematicFiles | None = None):
+        self.root = root
+        self.project = project if project is not None else root.stem
+        self.files = files if files is not None else SchematicFiles()
+        self.schematics: dict[Path, kiutils.schematic.Schematic] = {}
+        # KiCad 6 stored references of all sheet instances in root file, keyed by path without root UUID
+        self.legacy_references: dict[str, tuple[str, int]] = {}
+
+    def load(self, path: Path) -> kiutils.schematic.Schematic:
+        path = self.files.normalize(path)
+        if path not in self.schematics:
+            logger.debug(f"Parsing {path}")
+            content = self.files.read_bytes(path).decode("utf-8")
+            self.schematics[path] = kiutils.schematic.Schematic.from_sexpr(sexpr.parse_sexp(content))
+        return self.schematics[path]
+
+    def read(self) -> list[SchematicComponent]:
+        root = self.load(self.root)
+        for instance in root.symbolInstances:
+            self.legacy_references[instance.path] = (instance.reference, instance.unit)
+
+        components: dict[str, SchematicComponent] = {}
+        for component in self.walk(self.root, f"/{root.uuid}", "", set()):
+            existing = components.get(component.reference)
+            if existing is None:
+                components[component.reference] = component
+                continue
+            # Another unit of the same symbol. Fields of the lowest unit win, others only fill gaps.
+            first, second = (component, existing) if component.unit < existing.unit else (existing, component)
+            first.properties = second.properties | first.properties
+            first.value = first.value if first.value is not None else second.value
+            components[component.reference] = first
+        return sorted(components.values(), key=lambda component: natural_key(component.reference))
+
+    def walk(self, path: Path, sheet_path: str, legacy_path: str, visiting: set[Path]):
+        """Yields components of schematic and its sub-sheets. Sheet paths are UUIDs of sheet symbols."""
+        if self.files.normalize(path) in visiting:
+            raise ValueError(f"Recursive sheet hierarchy at {path}")
+        visiting = visiting | {self.files.normalize(path)}
+        schematic = self.load(path)
+
+        for symbol in schematic.schematicSymbols:
+            component = self.component(symbol, sheet_path, legacy_path)
+            if component is not None:
+                yield component
+
+        for sheet in schematic.sheets:
+            sheet_file = path.parent / sheet.fileName.value
+            try:
+                self.load(sheet_file)
+            except FileNotFoundError:
+                raise FileNotFoundError(f"Sheet file {sheet_file} used in {path} doesn't exist") from None
+            yield from self.walk(sheet_file, f"{sheet_path}/{sheet.uuid}", f"{legacy_path}/{sheet.uuid}", visiting)
+
+    def component(self, symbol: SchematicSymbol, sheet_path: str, legacy_path: str) -> SchematicComponent | None:
+        if not symbol.inBom:
+            return None
+        properties = {prop.key: prop.value for prop in symbol.properties if prop.value not in ["", "~"]}
+        reference, unit = self.instance_reference(symbol, sheet_path, legacy_path)
+        if reference is None:
+            reference = properties.get("Reference")
+        if reference is None or reference.startswith("#"):
+            return None
+        return SchematicComponent(reference, properties.get("Value"), properties, unit or symbol.unit or 1)
+
+    def instance_reference(
+        self, symbol: SchematicSymbol, sheet_path: str, legacy_path: str
+    ) -> tuple[str | None, int | None]:
+        """Returns reference and unit of symbol in given sheet instance."""
+        candidates = []
+        for instance in symbol.instances:
+            for path in instance.paths:
+                if path.sheetInstancePath == sheet_path:
+                    candidates.append((instance.name == self.project, path.reference, path.unit))
+        if candidates:
+            # Prefer instance of this project, if schematic is shared between projects
+            _, reference, unit = max(candidates, key=lambda candidate: candidate[0])
+            return reference, unit
+
+        legacy = self.legacy_references.get(f"{legacy_path}/{symbol.uuid}")
+        if legacy is not None:
+            return legacy
+        return None, None
+
+
+def read_components(
+    root: Path, project: str | None = None, files: SchematicFiles | None = None
+) -> list[SchematicComponent]:
+    return SchematicReader(root, project, files).read()
+
+
+def hierarchy_files(root: Path, files: SchematicFiles | None = None) -> dict[Path, bytes | None]:
+    """Returns content of root schematic and every sheet file it references, without parsing them.
+
+    Missing sheet files have content None.
+    """
+    files = files if files is not None else SchematicFiles()
+    contents: dict[Path, bytes | None] = {}
+    pending = [files.normalize(root)]
+    while pending:
+        path = pending.pop()
+        if path in contents:
+            continue
+        try:
+            contents[path] = files.read_bytes(path)
+        except FileNotFoundError:
+            contents[path] = None
+            continue
+        for match in SHEET_FILE_PATTERN.finditer(contents[path]):
+            name = re.sub(rb"\\(.)", rb"\1", match.group(1)).decode()
+            pending.append(files.normalize(path.parent / name))
+    return contents
+
+
+def fingerprint(root: Path, *extra: str, files: SchematicFiles | None = None) -> str:
+    """Returns hash of content of whole schematic hierarchy and `extra` strings.
+
+    It changes when any sheet is edited, added, removed or moved. Hierarchies with the same content have the same
+    fingerprint, whether they are read from disk or from git.
+    """
+    files = files if files is not None else SchematicFiles()
+    digest = hashlib.sha256()
+    for value in extra:
+        digest.update(value.encode() + b"\0")
+    for path, content in sorted(hierarchy_files(root, files).items()):
+        digest.update(os.path.relpath(path, files.normalize(root).parent).encode() + b"\0")
+        digest.update(hashlib.sha256(content).digest() if content is not None else b"missing")
+    return digest.hexdigest()
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+import zlib
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from mems.cache import CacheEntry
+
+logger = logging.getLogger(__name__)
+
+# File layout: header, index sorted by key hash, zlib compressed JSON records
+MAGIC = b"MEMSSNP1"
+HEADER = struct.Struct("<8sQ")  # magic, record count
+INDEX_ENTRY = struct.Struct("<8sQI")  # key hash, record offset, record length
+
+
+def key_hash(supplier: str, key: str) -> bytes:
+    return hashlib.blake2b(f"{supplier}\0{key}".encode(), digest_size=8).digest()
+
+
+def write_snapshot(path: Path, entries: Iterable[tuple[str, str, CacheEntry]]) -> int:
+    """Writes entries to snapshot file atomically. Returns number of written records."""
+    records = []
+    for supplier, key, entry in entries:
+        data = [supplier, key, entry.static, entry.volatile, entry.static_time, entry.volatile_time]
+        records.append((key_hash(supplier, key), zlib.compress(json.dumps(data, separators=(",", ":")).encode())))
+    records.sort(key=lambda record: record[0])
+
+    offset = HEADER.size + INDEX_ENTRY.size * len(records)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, len(records)))
+        for digest, record in records:
+            file.write(INDEX_ENTRY.pack(digest, offset, len(record)))
+            offset += len(record)
+        for _, record in records:
+            file.write(record)
+    os.replace(tmp_path, path)
+    return len(records)
+
+
+class Snapshot:
+    """Read only view of snapshot file. Records are decoded only when looked up."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        with open(path, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            logger.error(f"{path} is not a supplier snapshot")
+            sys.exit(1)
+
+    def index_entry(self, position: int) -> tuple[bytes, int, int]:
+        return INDEX_ENTRY.unpack_from(self.map, HEADER.size + position * INDEX_ENTRY.size)
+
+    def record(self, offset: int, length: int) -> list:
+        return json.loads(zlib.decompress(self.map[offset : offset + length]))
+
+    def get(self, supplier: str, key: str) -> CacheEntry | None:
+        digest = key_hash(supplier, key)
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.index_entry(middle)[0] < digest:
+                low = middle + 1
+            else:
+                high = middle
+
+        # Hashes may collide, so check every record with matching hash
+        while low < self.count:
+            entry_digest, offset, length = self.index_entry(low)
+            if entry_digest != digest:
+                break
+            record = self.record(offset, length)
+            if record[0] == supplier and record[1] == key:
+                return CacheEntry(*record[2:])
+            low += 1
+        return None
+
+    def entries(self) -> Iterator[tuple[str, str, CacheEntry]]:
+        for position in range(self.count):
+            _, offset, length = self.index_entry(position)
+            record = self.record(offset, length)
+            yield record[0], record[1], CacheEntry(*record[2:])
+
+
+_snapshots: dict[Path, Snapshot] = {}
+_snapshots_lock = threading.Lock()
+
+
+def open_snapshot(path: Path) -> Snapshot:
+    """Returns process wide snapshot for path, opening it on first use."""
+    path = Path(path).resolve()
+    with _snapshots_lock:
+        if path not in _snapshots:
+            if not path.exists():
+                logger.error(f"Supplier snapshot doesn't exist: {path}")
+                sys.exit(1)
+            _snapshots[path] = Snapshot(path)
+            logger.info(f"Serving supplier lookups from snapshot {path} ({_snapshots[path].count} parts)")
+        return _snapshots[path]
@@ -0,0 +1,248 @@
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from mems import suppliers
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8766
+
+MOUSER_PATH = urllib.parse.urlsplit(suppliers.MOUSER_SEARCH_URL).path
+LCSC_PRODUCT_PATH = urllib.parse.urlsplit(suppliers.LCSC_PRODUCT_URL).path
+LCSC_SEARCH_PATH = urllib.parse.urlsplit(suppliers.LCSC_SEARCH_URL).path
+
+TME_PRODUCTS_PATH = "/Products/GetProducts.json"
+TME_PRICES_PATH = "/Products/GetPricesAndStocks.json"
+DATASHEET_PATH = "/datasheets/"
+
+# Stub generates this many price breaks for every part, starting at quantity 1
+PRICE_BREAKS = [1, 10, 100, 1000]
+DATASHEET_SIZE = 256 * 1024
+
+
+class StubServer(ThreadingHTTPServer):
+    """Local imitation of Mouser, LCSC and TME endpoints, with made up parts, fixed latency and Mouser rate limit.
+
+    Parts are generated from hash of their number, so every run returns the same data.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, latency: float, jitter: float, per_minute: int | None, missing: float):
+        super().__init__(address, StubRequestHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.per_minute = per_minute
+        self.missing = missing
+        self.lock = threading.Lock()
+        self.mouser_requests: list[float] = []
+        self.served = 0
+        self.rejected = 0
+        self.started = time.monotonic()
+
+    def endpoints(self) -> dict[str, str]:
+        """Returns "endpoints" config section pointing supplier lookups at this server."""
+        base = f"http://{self.server_address[0]}:{self.server_port}"
+        return {
+            "mouser_search": base + MOUSER_PATH,
+            "lcsc_product": base + LCSC_PRODUCT_PATH,
+            "lcsc_search": base + LCSC_SEARCH_PATH,
+            "tme_api": base,
+        }
+
+    def delay(self):
+        time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+    def allow_mouser(self) -> bool:
+        """Sliding window limit of Mouser requests per minute."""
+        with self.lock:
+            now = time.monotonic()
+            self.mouser_requests = [t for t in self.mouser_requests if now - t < 60]
+            if self.per_minute is not None and len(self.mouser_requests) >= self.per_minute:
+                self.rejected += 1
+                return False
+            self.mouser_requests.append(now)
+            return True
+
+    def count(self):
+        with self.lock:
+            self.served += 1
+
+    def stats(self) -> str:
+        elapsed = time.monotonic() - self.started
+        return (
+            f"{self.served} requests served in {elapsed:.1f}s ({self.served / max(elapsed, 1e-9):.1f}/s), "
+            f"{self.rejected} rejected by rate limit"
+        )
+
+    def exists(self, number: str) -> bool:
+        return stub_random(number).random() >= self.missing
+
+
+def stub_random(number: str) -> random.Random:
+    return random.Random(hashlib.sha256(number.encode()).digest())
+
+
+def stub_prices(number: str) -> list[tuple[int, float]]:
+    rng = stub_random(number)
+    price = round(rng.uniform(0.01, 20.0), 4)
+    return [(quantity, round(price * 0.85**index, 4)) for index, quantity in enumerate(PRICE_BREAKS)]
+
+
+def stub_datasheet(name: str) -> bytes:
+    return b"%PDF-1.4\n" + stub_random(name).randbytes(DATASHEET_SIZE)
+
+
+def mouser_part(number: str, base: str) -> dict:
+    rng = stub_random(number)
+    return {
+        "ManufacturerPartNumber": number,
+        "MouserPartNumber": number,
+        "Description": f"Stub part {number}",
+        "DataSheetUrl": f"{base}{DATASHEET_PATH}{number}.pdf",
+        "AvailabilityInStock": str(rng.randrange(0, 100000)),
+        "Min": "1",
+        "PriceBreaks": [
+            {"Quantity": quantity, "Price": f"{price:.4f} USD".replace(".", ","), "Currency": "USD"}
+            for quantity, price in stub_prices(number)
+        ],
+    }
+
+
+def lcsc_product(sku: str, base: str) -> dict:
+    rng = stub_random(sku)
+    return {
+        "productCode": sku,
+        "productModel": f"STUB-{sku}",
+        "productIntroEn": f"Stub part {sku}",
+        "pdfUrl": f"{base}{DATASHEET_PATH}{sku}.pdf",
+        "stockNumber": rng.randrange(0, 100000),
+        "minBuyNumber": 1,
+        "productPriceList": [{"ladder": quantity, "usdPrice": price} for quantity, price in stub_prices(sku)],
+    }
+
+
+def tme_product(symbol: str, base: str) -> dict:
+    return {
+        "Symbol": symbol,
+        "OriginalSymbol": f"STUB-{symbol}",
+        "Description": f"Stub part {symbol}",
+        "ProductInformationPage": f"{base}{DATASHEET_PATH}{symbol}.pdf",
+        "MinAmount": 1,
+    }
+
+
+def tme_prices(symbol: str) -> dict:
+    return {
+        "Symbol": symbol,
+        "Amount": stub_random(symbol).randrange(0, 100000),
+        "PriceList": [{"Amount": quantity, "PriceValue": price} for quantity, price in stub_prices(symbol)],
+    }
+
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    server: StubServer
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        self.server.delay()
+        self.server.count()
+
+        if url.path == LCSC_PRODUCT_PATH:
+            sku = query.get("productCode", [""])[0]
+            exists = suppliers.LCSC_SKU_PATTERN.fullmatch(sku) is not None and self.server.exists(sku)
+            self.send_json(200, {"code": 200, "result": lcsc_product(sku, self.base()) if exists else None})
+        elif url.path == LCSC_SEARCH_PATH:
+            # Every part is served by JSON endpoint, so search always finds nothing
+            q = query.get("q", [""])[0]
+            self.send_body(200, "text/html", f"<html><title>Search by {q}</title></html>".encode())
+        elif url.path.startswith(DATASHEET_PATH):
+            self.send_datasheet(stub_datasheet(url.path.removeprefix(DATASHEET_PATH)))
+        else:
+            self.send_json(404, {"error": f"Unknown path {url.path}"})
+
+    def do_POST(self):
+        url = urllib.parse.urlsplit(self.path)
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.delay()
+        self.server.count()
+
+        if url.path in [TME_PRODUCTS_PATH, TME_PRICES_PATH]:
+            # Signature isn't checked
+            params = urllib.parse.parse_qs(body.decode())
+            symbols = [values[0] for key, values in params.items() if key.startswith("SymbolList[")]
+            symbols = [symbol for symbol in symbols if self.server.exists(symbol)]
+            if url.path == TME_PRODUCTS_PATH:
+                products = [tme_product(symbol, self.base()) for symbol in symbols]
+                self.send_json(200, {"Status": "OK", "Data": {"ProductList": products}})
+            else:
+                prices = [tme_prices(symbol) for symbol in symbols]
+                self.send_json(200, {"Status": "OK", "Data": {"Currency": "USD", "ProductList": prices}})
+            return
+        if url.path != MOUSER_PATH:
+            self.send_json(404, {"error": f"Unknown path {url.path}"})
+            return
+        if not self.server.allow_mouser():
+            self.send_json(200, {"Errors": [{"Code": "TooManyRequests", "Message": "Stub rate limit"}]})
+            return
+        try:
+            numbers = json.loads(body)["SearchByPartRequest"]["mouserPartNumber"].split("|")
+        except (ValueError, KeyError, TypeError, AttributeError):
+            self.send_json(200, {"Errors": [{"Code": "InvalidRequest", "Message": "Malformed request"}]})
+            return
+        numbers = [number.strip() for number in numbers]
+        parts = [mouser_part(number, self.base()) for number in numbers if self.server.exists(number)]
+        self.send_json(200, {"Errors": [], "SearchResults": {"NumberOfResult": len(parts), "Parts": parts}})
+
+    def base(self) -> str:
+        return f"http://{self.headers.get('Host', '127.0.0.1')}"
+
+    def send_datasheet(self, content: bytes):
+        """Sends file, or its part if request has `Range: bytes=<start>-` header."""
+        start = 0
+        if self.headers.get("Range", "").startswith("bytes="):
+            start = int(self.headers["Range"].removeprefix("bytes=").split("-")[0] or 0)
+        if start >= len(content):
+            self.send_body(416, "application/pdf", b"")
+            return
+        self.send_response(206 if start > 0 else 200)
+        self.send_header("Content-Type", "application/pdf")
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(len(content) - start))
+        if start > 0:
+            self.send_header("Content-Range", f"bytes {start}-{len(content) - 1}/{len(content)}")
+        self.end_headers()
+        self.wfile.write(content[start:])
+
+    def send_json(self, status: int, data: dict):
+        self.send_body(status, "application/json", json.dumps(data).encode())
+
+    def send_body(self, status: int, content_type: str, body: bytes):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+
+def run_stub_server(host: str, port: int, latency_ms: float, jitter_ms: float, per_minute: int | None, missing: float):
+    server = StubServer((host, port), latency_ms / 1000, jitter_ms / 1000, per_minute, missing)
+    logger.info(f"Supplier stub listening on http://{host}:{server.server_port}. Add to config.json:")
+    logger.info(json.dumps({"endpoints": server.endpoints()}, indent=4))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        logger.info(f"Supplier stub stopped. {server.stats()}")
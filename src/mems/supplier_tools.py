@@ -0,0 +1,137 @@
+import argparse
+import csv
+import datetime
+import logging
+import sys
+from pathlib import Path
+
+from mems import backends, cache, history, net, prefetch, snapshot, stub_server
+
+logger = logging.getLogger(__name__)
+
+
+def add_subparser(subparsers):
+    parser = subparsers.add_parser("suppliers", help="Tools for supplier data and lookups")
+
+    subparsers = parser.add_subparsers(dest="subcommand", required=True)
+
+    snapshot_parser = subparsers.add_parser(name="snapshot", help="Offline snapshots of cached supplier data")
+    snapshot_subparsers = snapshot_parser.add_subparsers(dest="snapshot_command", required=True)
+    export_parser = snapshot_subparsers.add_parser(name="export", help="Dump all cached parts to snapshot file")
+    export_parser.add_argument("path", type=Path, help="Snapshot file to create")
+    import_parser = snapshot_subparsers.add_parser(name="import", help="Load parts from snapshot file into cache")
+    import_parser.add_argument("path", type=Path, help="Snapshot file to load")
+
+    prefetch_parser = subparsers.add_parser(
+        name="prefetch", help="Refresh stale cached parts from BOM or consolidated CSVs, within API quota"
+    )
+    prefetch_parser.add_argument(
+        "paths",
+        type=Path,
+        nargs="+",
+        help="Supplier CSVs (fab/bom/Mouser.csv, consolidated_Mouser.csv) or project directories",
+    )
+    prefetch_parser.add_argument(
+        "-s", "--supplier", default=None, help="Supplier of all given CSVs. Default: taken from file names"
+    )
+    prefetch_parser.add_argument(
+        "--reserve",
+        type=int,
+        default=prefetch.DEFAULT_RESERVE,
+        help=f"Daily API requests left unused for interactive runs. Default: {prefetch.DEFAULT_RESERVE}",
+    )
+    prefetch_parser.add_argument(
+        "--background", action="store_true", help="Run as detached low priority process and return immediately"
+    )
+    cache.add_arguments(prefetch_parser)
+    net.add_arguments(prefetch_parser)
+
+    history_parser = subparsers.add_parser(name="history", help="Show recorded stock and price history of part")
+    history_parser.add_argument("sku", help="Supplier SKU, or mpn:<MPN> for parts looked up by MPN")
+    history_parser.add_argument("-s", "--supplier", default=None, help="Supplier of SKU. Default: all suppliers")
+    history_parser.add_argument("--since", default=None, help="First month to show, as YYYY-MM")
+    history_parser.add_argument(
+        "--changes", action="store_true", help="Show only samples where stock or price changed"
+    )
+
+    stub_parser = subparsers.add_parser(
+        name="stub-server", help="Run local imitation of Mouser, LCSC and TME APIs for offline testing and benchmarks"
+    )
+    stub_parser.add_argument("--host", default="127.0.0.1", help="Address to listen on. Default: 127.0.0.1")
+    stub_parser.add_argument(
+        "-p", "--port", type=int, default=stub_server.DEFAULT_PORT, help=f"Default: {stub_server.DEFAULT_PORT}"
+    )
+    stub_parser.add_argument("--latency", type=float, default=200.0, help="Response latency in ms. Default: 200")
+    stub_parser.add_argument("--jitter", type=float, default=0.0, help="Random latency variation in ms. Default: 0")
+    stub_parser.add_argument(
+        "--per-minute",
+        type=int,
+        default=30,
+        help="Mouser requests per minute before TooManyRequests errors, 0 disables limit. Default: 30",
+    )
+    stub_parser.add_argument(
+        "--missing", type=float, default=0.0, help="Fraction of part numbers that are not found. Default: 0"
+    )
+
+    parser.set_defaults(func=run)
+
+
+def run(args: argparse.Namespace):
+    if args.subcommand == "snapshot":
+        if args.snapshot_command == "export":
+            export_snapshot(args.path)
+        if args.snapshot_command == "import":
+            import_snapshot(args.path)
+    if args.subcommand == "prefetch":
+        csvs = prefetch.find_csvs(args.paths, args.supplier)
+        if args.background:
+            prefetch.spawn_background(sys.argv[1:])
+            return
+        cache.configure(args)
+        net.configure(args)
+        prefetch.prefetch(csvs, args.reserve)
+    if args.subcommand == "history":
+        show_history(args.sku, args.supplier, args.since, args.changes)
+    if args.subcommand == "stub-server":
+        stub_server.run_stub_server(
+            args.host, args.port, args.latency, args.jitter, args.per_minute or None, args.missing
+        )
+
+
+def export_snapshot(path: Path):
+    count = snapshot.write_snapshot(path, cache.get_cache().entries())
+    logger.info(f"Exported {count} parts to {path}")
+
+
+def import_snapshot(path: Path):
+    store = cache.get_cache()
+    count = 0
+    for supplier, key, entry in snapshot.open_snapshot(path).entries():
+        store.put_entry(supplier, key, entry)
+        count += 1
+    logger.info(f"Imported {count} parts from {path}")
+
+
+def show_history(sku: str, supplier: str | None, since: str | None, only_changes: bool):
+    keys = [(name, sku.strip()) for name in ([supplier] if supplier is not None else backends.BACKENDS)]
+    names = {history.key_id(name, key): name for name, key in keys}
+    samples = history.query(keys, since)
+    if only_changes:
+        samples = history.changes(samples)
+    if len(samples) == 0:
+        logger.error(f"No history recorded for {sku}")
+        sys.exit(1)
+
+    writer = csv.writer(sys.stdout, delimiter=";")
+    writer.writerow(["Time", "Supplier", "SKU", "In stock", "Price [zł/unit]", "Best price [zł/unit]"])
+    for sample in samples:
+        writer.writerow(
+            [
+                datetime.datetime.fromtimestamp(sample["time"]).strftime("%Y-%m-%d %H:%M"),
+                names[int(sample["key"])],
+                sku,
+                int(sample["availability"]) if sample["availability"] >= 0 else None,
+                round(float(sample["price"]), 4),
+                round(float(sample["best_price"]), 4),
+            ]
+        )
@@ -1,17 +1,67 @@
-import logging
-import json
-import requests
+import base64
 import dataclasses
+import hashlib
+import hmac
+import html
+import json
+import logging
 import re
+import sys
+import time
+import urllib.parse
+from typing import Callable
+
+import requests
+from bs4 import BeautifulSoup, PageElement, Tag
 
-from bs4 import BeautifulSoup, PageElement
-from sane_logging import sys
+from mems import net, ratelimit, utils
 
 logger = logging.getLogger(__name__)
 
 # Rough currency estimates. Update if reeeaaallly out of date. Used only if no other option available:
 CURRENCY_TO_PLN = {"PLN": 1.0, "USD": 4.0, "EUR": 4.3}
 
+MOUSER_SEARCH_URL = "https://api.mouser.com/api/v1/search/partnumber"
+# Maximum number of part numbers that Mouser accepts in one SearchByPartRequest
+MOUSER_BATCH_SIZE = 10
+# Consecutive rate limit errors after which we give up instead of waiting
+MOUSER_MAX_RETRIES = 8
+
+TME_API_URL = "https://api.tme.eu"
+# Maximum number of symbols in SymbolList of one TME request
+TME_BATCH_SIZE = 50
+TME_DEFAULTS = {"country": "PL", "currency": "PLN", "language": "EN"}
+
+LCSC_SEARCH_URL = "https://www.lcsc.com/search"
+# JSON endpoint that LCSC product pages load their data from
+LCSC_PRODUCT_URL = "https://wmsc.lcsc.com/ftps/wm/product/detail"
+LCSC_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/109.0.0.0 Safari/537.36",
+    "Accept": "text/html",
+    "Accept-Language": "en-US,en;q=0.9",
+    "Accept-Encoding": "gzip, deflate, br",
+}
+LCSC_SKU_PATTERN = re.compile(r"C\d+")
+LCSC_NOT_FOUND = re.compile(r"<title>[^<]*Search by ")
+LCSC_LABELS = ["Mfr. Part #", "LCSC Part #", "Description", "Datasheet"]
+# Product detail fragment starts with the first of these
+LCSC_DETAIL_START = re.compile(r"In[ -]Stock|Mfr\. Part #|LCSC Part #")
+# All fields of product detail, matched in one pass: stock, label/value table rows, price table rows and MOQ
+LCSC_DETAIL = re.compile(
+    r"In[ -]Stock:\s*(?P<stock>[\d,]+)"
+    r"|(?P<label>Mfr\. Part #|LCSC Part #|Description|Datasheet)\s*:?\s*(?:<(?!/td)[^>]*>\s*)*</td>\s*"
+    r"<td[^>]*>(?P<value>.*?)</td>"
+    r"|<td[^>]*>\s*(?P<qty>[\d,]+)\+?\s*</td>\s*<td[^>]*>\s*<span[^>]*>[^<\d]*(?P<price>\d+\.\d+)"
+    r"|Minimum\s*:\s*(?P<minimum>[\d,]+)",
+    re.DOTALL,
+)
+LCSC_TAG = re.compile(r"<[^>]*>")
+LCSC_HREF = re.compile(r'href="([^"]+)"')
+
+
+class MissingCredentials(Exception):
+    """Raised when supplier API can't be searched, because its credentials aren't configured."""
+
 
 @dataclasses.dataclass
 class PriceBreak:
@@ -30,10 +80,12 @@ class Part:
     price_breaks: list[PriceBreak]
 
     def price_at_qty(self, quantity: int) -> float | None:
-        price = next(filter(lambda x: x.quantity >= quantity, self.price_breaks), None)
-        if price is None:
-            return None
-        return price.price_pln
+        price = None
+        for price_break in self.price_breaks:
+            if price_break.quantity > quantity:
+                break
+            price = price_break.price_pln
+        return price
 
     def cheapest_order(self, quantity: int) -> float | None:
         if quantity < self.min_order_qty:
@@ -49,7 +101,7 @@ class Part:
 
 def price_break_from_mouser(data: dict) -> PriceBreak:
     quantity = int(data["Quantity"])
-    price = float(data["Price"].split().replace(",", "."))
+    price = float(data["Price"].split()[0].replace(",", "."))
     price_pln = price * CURRENCY_TO_PLN[data["Currency"]]
     return PriceBreak(quantity=quantity, price_pln=price_pln)
 
@@ -59,7 +111,7 @@ def part_from_mouser(data: dict) -> Part:
     sku = data["MouserPartNumber"]
     description = data["Description"]
     datasheet = data["DataSheetUrl"]
-    availability = int(data["AvailabilityInStock"])
+    availability = int(data["AvailabilityInStock"]) if data.get("AvailabilityInStock") is not None else None
     min_order_qty = int(data["Min"])
 
     price_breaks = [price_break_from_mouser(price_break) for price_break in data["PriceBreaks"]]
@@ -68,18 +120,216 @@ def part_from_mouser(data: dict) -> Part:
     return Part(mpn, sku, description, datasheet, availability, min_order_qty, price_breaks)
 
 
-def search_mouser(query: str, api_key: str, exact: bool = False) -> list[Part]:
-    data = json.dumps(
-        {"SearchByPartRequest": {"mouserPartNumber": query, "partSearchOptions": "Exact" if exact else None}}
-    )
+def search_mouser(query: str) -> dict:
+    """Searches Mouser by part number. Returns raw JSON response."""
+    limiter = ratelimit.get_limiter("Mouser")
+    data = json.dumps({"SearchByPartRequest": {"mouserPartNumber": query}})
     headers = {"Content-type": "application/json", "accept": "application/json"}
-    r = requests.post(
-        "https://api.mouser.com/api/v1/search/partnumber",
-        params={"apiKey": api_key},
+    # Every attempt counts against quota, including retries after timeouts and server errors
+    r = net.post(
+        net.endpoint("mouser_search", MOUSER_SEARCH_URL),
+        acquire=limiter.acquire if limiter is not None else None,
+        params={"apiKey": utils.get_api_key()},
         data=data,
         headers=headers,
     )
-    return [part_from_mouser(part) for part in r.json()["SearchResult"]["Parts"]]
+    return r.json()
+
+
+def search_mouser_batch(values: list[str], match: Callable[[dict, str], dict | None]) -> dict[str, dict | None]:
+    """Searches Mouser for many part numbers, packing up to MOUSER_BATCH_SIZE of them into each request.
+
+    Response parts are assigned back to searched values with `match(response, value)`.
+    """
+    limiter = ratelimit.get_limiter("Mouser")
+    results = {}
+    for start in range(0, len(values), MOUSER_BATCH_SIZE):
+        batch = values[start : start + MOUSER_BATCH_SIZE]
+        response = search_mouser("|".join(batch))
+        retries = 0
+        while len(response["Errors"]) > 0:
+            if response["Errors"][0]["Code"] != "TooManyRequests":
+                logger.error(f"Mouser returned error for {batch}: {response['Errors']}")
+                break
+            retries += 1
+            if retries > MOUSER_MAX_RETRIES:
+                logger.error(f"Mouser keeps rejecting requests with rate limit error: {response['Errors']}")
+                sys.exit(1)
+            if limiter is not None:
+                limiter.rate_limited()
+            else:
+                time.sleep(2)
+            response = search_mouser("|".join(batch))
+        if limiter is not None and retries > 0:
+            limiter.succeeded()
+
+        for value in batch:
+            results[value] = match(response, value) if len(response["Errors"]) == 0 else None
+    return results
+
+
+def find_matching_mouser_part(response: dict, field: str, value: str) -> dict | None:
+    """Returns part from Mouser response whose `field` (e.g. "MouserPartNumber") is equal to `value`."""
+    try:
+        parts = response["SearchResults"]["Parts"]
+    except (KeyError, TypeError):
+        logger.error(f"Empty response from Mouser: {response}")
+        return None
+    return next(
+        (part for part in parts if part.get(field) is not None and part[field].strip() == value.strip()),
+        None,
+    )
+
+
+def tme_request(action: str, params: dict[str, str]) -> dict:
+    """Sends signed request to TME API, e.g. action "Products/GetProducts". Returns "Data" of response.
+
+    Raises `requests.HTTPError` if TME rejected request or credentials.
+    """
+    credentials = utils.get_tme_credentials()
+    if credentials is None:
+        raise requests.HTTPError("TME API credentials are not configured")
+    token, app_secret = credentials
+    url = net.endpoint("tme_api", TME_API_URL).rstrip("/") + f"/{action}.json"
+    params = dict(sorted((params | {"Token": token}).items()))
+    signature_base = "&".join(
+        urllib.parse.quote(text, safe="") for text in ["POST", url, urllib.parse.urlencode(params)]
+    )
+    signature = hmac.new(app_secret.encode(), signature_base.encode(), hashlib.sha1).digest()
+    params["ApiSignature"] = base64.b64encode(signature).decode()
+
+    r = net.post(url, data=params)
+    try:
+        response = r.json()
+    except ValueError:
+        r.raise_for_status()
+        raise
+    if response.get("Status") != "OK":
+        if response.get("Status") == "E_AUTHENTICATION_FAILED":
+            raise requests.HTTPError("TME rejected API credentials. Check \"tme\" section of config")
+        raise requests.HTTPError(f"TME {action} failed: {response.get('Status')} {response.get('Error', '')}")
+    return response["Data"]
+
+
+def part_from_tme(product: dict, stock: dict | None, currency: str) -> Part:
+    price_breaks = [
+        PriceBreak(int(row["Amount"]), float(row["PriceValue"]) * CURRENCY_TO_PLN[currency])
+        for row in (stock or {}).get("PriceList") or []
+    ]
+    price_breaks = sorted(price_breaks, key=lambda x: x.quantity)
+    availability = int(stock["Amount"]) if stock is not None and stock.get("Amount") is not None else None
+    page = product.get("ProductInformationPage") or ""
+    return Part(
+        mpn=product["OriginalSymbol"],
+        sku=product["Symbol"],
+        description=product.get("Description") or "",
+        datasheet="https:" + page if page.startswith("//") else page,
+        availability=availability,
+        min_order_qty=int(product.get("MinAmount") or 1),
+        price_breaks=price_breaks,
+    )
+
+
+def search_tme(symbols: list[str]) -> dict[str, Part | None]:
+    """Looks up TME symbols with product and price/stock endpoints, TME_BATCH_SIZE symbols per request.
+
+    Raises `MissingCredentials` if TME API credentials aren't configured.
+    """
+    if utils.get_tme_credentials() is None:
+        raise MissingCredentials(
+            'No TME "token" and "app_secret" in "tme" section of config (or TME_TOKEN and TME_APP_SECRET)'
+        )
+    config = TME_DEFAULTS | utils.get_config().get("tme", {})
+    results: dict[str, Part | None] = {}
+    for start in range(0, len(symbols), TME_BATCH_SIZE):
+        batch = symbols[start : start + TME_BATCH_SIZE]
+        params = {f"SymbolList[{i}]": symbol for i, symbol in enumerate(batch)}
+        params |= {"Country": config["country"], "Language": config["language"]}
+        products = tme_request("Products/GetProducts", params)["ProductList"]
+        stocks = tme_request("Products/GetPricesAndStocks", params | {"Currency": config["currency"]})
+        currency = stocks.get("Currency", config["currency"])
+        stock_by_symbol = {stock["Symbol"]: stock for stock in stocks["ProductList"]}
+        by_symbol = {
+            product["Symbol"]: part_from_tme(product, stock_by_symbol.get(product["Symbol"]), currency)
+            for product in products
+        }
+        for symbol in batch:
+            results[symbol] = by_symbol.get(symbol)
+    return results
+
+
+def part_from_lcsc_json(data: dict) -> Part:
+    price_breaks = [
+        PriceBreak(int(row["ladder"]), float(row.get("usdPrice") or row["productPrice"]) * CURRENCY_TO_PLN["USD"])
+        for row in data.get("productPriceList") or []
+    ]
+    price_breaks = sorted(price_breaks, key=lambda x: x.quantity)
+    stock = data.get("stockNumber")
+    minimum = data.get("minBuyNumber") or (price_breaks[0].quantity if price_breaks else 1)
+
+    return Part(
+        mpn=data["productModel"],
+        sku=data["productCode"],
+        description=data.get("productIntroEn") or "",
+        datasheet=data.get("pdfUrl") or "",
+        availability=int(stock) if stock is not None else None,
+        min_order_qty=int(minimum),
+        price_breaks=price_breaks,
+    )
+
+
+def fetch_lcsc_json(sku: str) -> Part | None:
+    """Fetches part from JSON endpoint used by LCSC product pages. Returns None if it isn't available."""
+    r = net.get(
+        net.endpoint("lcsc_product", LCSC_PRODUCT_URL),
+        params={"productCode": sku},
+        headers=LCSC_HEADERS | {"Accept": "application/json"},
+    )
+    try:
+        result = r.json().get("result")
+    except ValueError:
+        return None
+    if not isinstance(result, dict) or result.get("productCode") != sku:
+        return None
+    try:
+        return part_from_lcsc_json(result)
+    except (KeyError, TypeError, ValueError) as e:
+        logger.debug(f"Unexpected LCSC product JSON for {sku}: {e}")
+        return None
+
+
+def part_from_lcsc_html(content: str) -> Part | None:
+    """Parses product detail fragment of LCSC page in single regex pass. Returns None if any field is missing."""
+    start = LCSC_DETAIL_START.search(content)
+    if start is None:
+        return None
+    end = content.find("<footer", start.start())
+    if end == -1:
+        end = len(content)
+
+    fields: dict[str, str] = {}
+    availability = None
+    minimum = None
+    prices = []
+    for match in LCSC_DETAIL.finditer(content, start.start(), end):
+        if match["stock"] is not None:
+            availability = int(match["stock"].replace(",", ""))
+        elif match["label"] is not None:
+            fields.setdefault(match["label"], match["value"])
+        elif match["qty"] is not None:
+            prices.append(PriceBreak(int(match["qty"].replace(",", "")), float(match["price"]) * CURRENCY_TO_PLN["USD"]))
+        elif match["minimum"] is not None:
+            minimum = int(match["minimum"].replace(",", ""))
+
+    datasheet = LCSC_HREF.search(fields.get("Datasheet", ""))
+    if minimum is None or datasheet is None or any(label not in fields for label in LCSC_LABELS):
+        return None
+
+    def text(label: str) -> str:
+        return html.unescape(LCSC_TAG.sub("", fields[label])).strip()
+
+    prices = sorted(prices, key=lambda x: x.quantity)
+    return Part(text("Mfr. Part #"), text("LCSC Part #"), text("Description"), datasheet[1], availability, minimum, prices)
 
 
 def lcsc_get_field(soup: BeautifulSoup, query: str) -> PageElement | None:
@@ -91,60 +341,103 @@ def lcsc_get_field(soup: BeautifulSoup, query: str) -> PageElement | None:
     return None
 
 
-def search_lcsc(query: str) -> list[Part]:
-    r = requests.get(
-        "https://www.lcsc.com/search",
-        params={"q": query},
-        headers={
-            "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/109.0.0.0 Safari/537.36",
-            "Accept": "text/html",
-            "Accept-Language": "en-US,en;q=0.9",
-            "Accept-Encoding": "gzip, deflate, br",
-        },
-    )
-    soup = BeautifulSoup(r.content, "html.parser")
-
-    if soup.title is not None and soup.title.string is not None and "Search by " in soup.title.string:
-        return []
+def part_from_lcsc_soup(content: str) -> Part | None:
+    """Parses whole LCSC page with BeautifulSoup. Slow, used only if `part_from_lcsc_html` fails."""
+    soup = BeautifulSoup(content, "html.parser")
 
-    in_stock = soup.find("div", string=re.compile("In Stock:.*"))
+    in_stock = soup.find(string=re.compile(r"In[ -]Stock:"))
     availability = None
     if in_stock is not None:
-        availability = int(in_stock.text.split(":")[1].strip())
+        stock = re.search(r"\d[\d,]*", in_stock.split(":", 1)[1])
+        availability = int(stock[0].replace(",", "")) if stock is not None else None
     prices = []
     qty_header = soup.find(string=re.compile("Qty.*"))
     if qty_header is not None:
         price_table = qty_header.find_parent("table")
         if price_table is not None and price_table.tbody is not None:
             for row in price_table.tbody.contents:
-                tds = row.find_all("td")  # type: ignore
-                qty = int(re.findall(r"\d+", tds[0].string.strip())[0])
-                unit_price_usd = float(re.findall(r"\d+\.\d+", tds[1].span.string.strip())[0])
-                prices.append(PriceBreak(qty, unit_price_usd * CURRENCY_TO_PLN["USD"]))
+                # Whitespace between rows is parsed as strings
+                if not isinstance(row, Tag):
+                    continue
+                tds = row.find_all("td")
+                if len(tds) < 2:
+                    continue
+                qty = re.search(r"\d[\d,]*", tds[0].get_text())
+                unit_price_usd = re.search(r"\d+\.\d+", tds[1].get_text())
+                if qty is None or unit_price_usd is None:
+                    logger.debug(f"Skipping unexpected LCSC price row {row.get_text()!r}")
+                    continue
+                prices.append(
+                    PriceBreak(int(qty[0].replace(",", "")), float(unit_price_usd[0]) * CURRENCY_TO_PLN["USD"])
+                )
 
     mpn_q = lcsc_get_field(soup, r"Mfr. Part *")
     if mpn_q is None:
-        sys.exit("MPN not found on LCSC site")
+        logger.error("MPN not found on LCSC site")
+        return None
     mpn = mpn_q.text.strip()
 
     sku_q = lcsc_get_field(soup, "LCSC Part #")
     if sku_q is None:
-        sys.exit("SKU not found on LCSC site")
+        logger.error("SKU not found on LCSC site")
+        return None
     sku = sku_q.text.strip()
 
     desc_q = lcsc_get_field(soup, "Description")
     if desc_q is None:
-        sys.exit("Description not found on LCSC site")
+        logger.error("Description not found on LCSC site")
+        return None
     desc = desc_q.text.strip()
 
     data_q = lcsc_get_field(soup, "Datasheet")
     if data_q is None or data_q.a is None:  # type: ignore
-        sys.exit("Datasheet not found on LCSC site")
+        logger.error("Datasheet not found on LCSC site")
+        return None
     data = data_q.a.attrs["href"]  # type: ignore
 
     min_q = soup.find(string=re.compile("Minimum : *"))
-    if min_q is None:
-        sys.exit("Minimum order quantity not found on LCSC site")
-    minimum = int(min_q.split()[-1])  # type: ignore
+    minimum = re.search(r"\d[\d,]*", min_q) if min_q is not None else None
+    if minimum is None:
+        logger.error("Minimum order quantity not found on LCSC site")
+        return None
+
+    prices = sorted(prices, key=lambda x: x.quantity)
+    return Part(mpn, sku, desc, data, availability, int(minimum[0].replace(",", "")), prices)
+
+
+def search_lcsc(query: str) -> list[Part]:
+    query = query.strip()
+    if LCSC_SKU_PATTERN.fullmatch(query):
+        part = fetch_lcsc_json(query)
+        if part is not None:
+            return [part]
+        logger.debug(f"LCSC product JSON not available for {query}, falling back to search page")
+
+    r = net.get(net.endpoint("lcsc_search", LCSC_SEARCH_URL), params={"q": query}, headers=LCSC_HEADERS)
+    content = r.text
+    if LCSC_NOT_FOUND.search(content) is not None:
+        return []
+
+    part = part_from_lcsc_html(content)
+    if part is None:
+        logger.debug(f"Couldn't parse LCSC page fragment for {query}, parsing whole page")
+        part = part_from_lcsc_soup(content)
+    if part is None:
+        return []
+    return [part]
+
+
+if __name__ == "__main__":
+    # Compares LCSC page parsers on saved pages: python -m mems.suppliers [page.html ...]
+    # Without arguments, pages saved in fixtures/lcsc of the repository are used.
+    import timeit
+    from pathlib import Path
 
-    return [Part(mpn, sku, desc, data, availability, minimum, prices)]
+    fixtures = Path(__file__).parents[2] / "fixtures" / "lcsc"
+    pages = sys.argv[1:] or sorted(str(path) for path in fixtures.glob("*.html"))
+    for path in pages:
+        with open(path, encoding="utf-8") as page:
+            content = page.read()
+        for name, parser in [("fragment", part_from_lcsc_html), ("soup", part_from_lcsc_soup)]:
+            count, total = timeit.Timer(lambda: parser(content)).autorange()
+            print(f"{path}: {name:>8} {total / count * 1000:8.2f} ms/page -> {parser(content)}")
@@ -1,17 +1,12 @@
-from dataclasses import dataclass
 import os
 import pathlib
 import json
-import re
 import sys
 import logging
 import git
-from typing import List
 import xdg.BaseDirectory
 from pathlib import Path
 import termcolor
-import requests
-import bs4
 from importlib import resources
 import shutil
 
@@ -82,19 +77,6 @@ def get_config():
     return config_json
 
 
-def search_mouser(val):
-    api_key = get_api_key()
-    data = json.dumps({"SearchByPartRequest": {"mouserPartNumber": val}})
-    headers = {"Content-type": "application/json", "accept": "application/json"}
-    r = requests.post(
-        "https://api.mouser.com/api/v1/search/partnumber",
-        params={"apiKey": api_key},
-        data=data,
-        headers=headers,
-    )
-    return r.json()
-
-
 def get_api_key():
     if "MOUSER_API_KEY" in os.environ:
         return os.environ["MOUSER_API_KEY"]
@@ -106,6 +88,17 @@ def get_api_key():
     sys.exit(termcolor.colored('Error: No "api_key" found in config', "red"))
 
 
+def get_tme_credentials() -> tuple[str, str] | None:
+    """Returns TME API (token, app secret), or None if they aren't configured."""
+    if "TME_TOKEN" in os.environ and "TME_APP_SECRET" in os.environ:
+        return os.environ["TME_TOKEN"], os.environ["TME_APP_SECRET"]
+
+    config = get_config().get("tme", {})
+    if config.get("token") and config.get("app_secret"):
+        return config["token"], config["app_secret"]
+    return None
+
+
 def check_repo_clean(repo: git.Repo):
     """Stops program if repo is not clean."""
     if repo.is_dirty(untracked_files=True):
@@ -140,74 +133,3 @@ def set_text_variable(name: str, value: str, override: bool = True):
     if (name not in variables) or override:
         variables[name] = value
         set_pro_json(j)
-
-
-@dataclass
-class PriceRow:
-    moq: int
-    unit_price: float
-
-
-@dataclass
-class LCSCItem:
-    sku: str
-    in_stock_qty: int
-    prices: List[PriceRow]
-
-    def get_price(self, qty):
-        price = self.prices[0].unit_price
-        for row in self.prices:
-            if row.moq <= qty:
-                price = row.unit_price
-        return price
-
-
-def search_lcsc(sku):
-    r = requests.get(
-        "https://www.lcsc.com/search",
-        params={"q": sku},
-        headers={
-            "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/109.0.0.0 Safari/537.36",
-            "Accept": "text/html",
-            "Accept-Language": "en-US,en;q=0.9",
-            "Accept-Encoding": "gzip, deflate, br",
-        },
-    )
-    soup = bs4.BeautifulSoup(r.content, "html.parser")
-
-    if "Search by " in soup.title.string:
-        return None
-
-    try:
-        qty_in_stock = int(
-            soup.find("span", string=re.compile("In-Stock:.*")).text.split(":")[1].strip().replace(",", "")
-        )
-    except AttributeError as e:
-        logger.error(f"Could not check availability. {e}")
-        qty_in_stock = 0
-
-    prices = list()
-    try:
-        price_table = soup.find(string=re.compile("Qty.*")).find_parent("table").tbody
-        for row in price_table:
-            if not isinstance(row, bs4.element.Tag):
-                continue
-
-            tds = row.find_all("td")
-            if len(tds) < 2:
-                continue
-
-            qty = int(re.findall(r"\d+,?\d*", tds[0].string.strip())[0].replace(",", ""))
-            unit_price = float(re.findall(r"\d+\.\d+", tds[1].span.string.strip())[0])
-            prices.append(PriceRow(qty, unit_price))
-
-    except AttributeError as e:
-        logger.error(f"Could not check prices. {e}")
-        prices.append(PriceRow(0, 0))
-
-    return LCSCItem(sku, qty_in_stock, prices)
-
-
-if __name__ == "__main__":
-    item = search_lcsc("C97095")
-    print(item)
@@ -0,0 +1,24 @@
+from pathlib import Path
+
+from mems.release import bom
+
+# Hierarchy with a sheet used twice and a multi-unit symbol, with its `kicad-cli sch export python-bom` export
+FIXTURE = Path(__file__).resolve().parent.parent / "fixtures" / "schematic"
+
+
+def summarize(components: list[bom.Component]) -> dict[str, tuple]:
+    return {component.reference: (component.value, component.mpn, component.skus) for component in components}
+
+
+def test_reader_matches_kicad_cli_export(monkeypatch):
+    monkeypatch.chdir(FIXTURE)
+    monkeypatch.setattr(bom, "get_filename", lambda: str(FIXTURE / "proj.xml"))
+    report = bom.BOM()
+
+    read = summarize(report.read_schematic())
+    exported = summarize(report.parse_xml())
+
+    assert read == exported
+    assert sorted(read) == ["C10", "C2", "R1", "U1"]
+    # Properties of multi-unit symbol are merged from all its units
+    assert read["U1"] == ("LM358", "LM358DR", {"TME": "LM358-T", "LCSC": "C7950"})